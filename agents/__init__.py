@@ -3,9 +3,12 @@ from agents.greedy import GreedyEngine, WeightedGreedyEngine
 from agents.rand import RandomEngine
 from agents.mcts import MonteCarloTreeSearch
 from agents.negamax import NegamaxEngine
-from agents.alphabeta import AlphaBetaEngine, ABCachedEngine, ABDeepEngine
-from agents.pvs import PVSEngine, PVSCachedEngine, PVSDeepEngine
-from agents.human import HumanEngine
+from agents.alphabeta import (AlphaBetaEngine, ABCachedEngine, ABDeepEngine,
+                              ABSplitEngine)
+from agents.pvs import (PVSEngine, PVSCachedEngine, PVSDeepEngine,
+                        PVSSplitEngine, PVSYBWEngine)
+from agents.mtdf import MTDFEngine
+from agents.solver import SolverEngine
 
 
 __all__ = ['Engine',
@@ -17,7 +20,14 @@ __all__ = ['Engine',
            'AlphaBetaEngine',
            'ABCachedEngine',
            'ABDeepEngine',
+           'ABSplitEngine',
            'PVSEngine',
            'PVSCachedEngine',
            'PVSDeepEngine',
-           'HumanEngine']
+           'PVSSplitEngine',
+           'PVSYBWEngine',
+           'MTDFEngine',
+           'SolverEngine']
+
+# HumanEngine (agents.human) is not imported here, it needs pygame and the
+# view, which the engines must not depend on.
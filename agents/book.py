@@ -0,0 +1,22 @@
+from game.book import Book
+
+
+class BookEngineMixin(object):
+    """Play the move of the opening book when the position is in it
+
+    book is the path of a book file (see game.book), the positions that
+    are not in it are searched.
+    """
+    def __init__(self, *args, **kwargs):
+        path = kwargs.pop('book', None)
+        super(BookEngineMixin, self).__init__(*args, **kwargs)
+        self._book = Book(path) if path else None
+
+    def choose(self, game_problem, board):
+        if self._book is not None:
+            found = self._book.probe(board)
+            if found is not None:
+                move, score = found
+                print('book move: %d, score: %d' % (move + 1, score))
+                return move
+        return super(BookEngineMixin, self).choose(game_problem, board)
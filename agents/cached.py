@@ -3,23 +3,67 @@ from game.cache import Cache
 
 
 class CachedEngineMixin(object):
+    # the mixins sharing the table with other processes set it to
+    # SharedCache in their __init__, the table is made after all of them
+    _cache_class = Cache
+
     def __init__(self, *args, **kwargs):
+        cache_mb = kwargs.pop('cache_mb', Cache.DEFAULT_MB)
         super(CachedEngineMixin, self).__init__(*args, **kwargs)
-        self._cache = Cache()
+        self._cache = self._cache_class(cache_mb)
+
+    def choose(self, game_problem, board):
+        self._cache.new_search()
+        return super(CachedEngineMixin, self).choose(game_problem, board)
+
+    def principal_variation(self, board, depth):
+        """Return the PV of the last search, made longer with the moves of
+        the cache
+
+        The PV of the search stops at the cache hits, it goes on with the
+        best moves of the EXACT entries kept in the cache, up to depth moves
+        or the end of the game.
+        """
+        pv = super(CachedEngineMixin, self).principal_variation(board, depth)
+        for m in pv:
+            board.push(m)
+        played = len(pv)
+        while played < depth and board.end is None:
+            move = self._cache.move(board, depth - played)
+            if move is None or not board.can_play(move):
+                break
+            board.push(move)
+            pv.append(move)
+            played += 1
+        for m in pv:
+            board.pop()
+        return pv
 
-    def search(self, game_problem, board, depth, ply=1, alpha=-INF, beta=INF):
+    def search(self, game_problem, board, depth, ply=1, alpha=-INF, beta=INF,
+               hint=None):
         hit, move, score = self._cache.lookup(board, depth, ply, alpha, beta)
+        if self._counting:
+            self.inc('probes', depth)
+            if hit:
+                self.inc('hits', depth)
         if hit:
-            self.inc('hits')
-            if move is not None:
-                move = [move]
+            if move is None:
+                self._pv.clear(ply)
             else:
-                move = []
-            return move, score
+                self._pv.clear(ply + 1)
+                self._pv.update(ply, move)
+            return score
         else:
-            move, score = super(CachedEngineMixin, self).search(game_problem,
-                                                                board, depth, ply,
-                                                                alpha, beta,
-                                                                hint=move)
-            self._cache.put(board, move, depth, ply, score, alpha, beta)
-            return move, score
+            if move is None:
+                move = hint
+            score = super(CachedEngineMixin, self).search(game_problem,
+                                                          board, depth, ply,
+                                                          alpha, beta,
+                                                          hint=move)
+            # a node failing low has no best move and leaves its row of the
+            # PV table as it was, the move it was searched first with is
+            # kept for the next search
+            self._cache.put(board,
+                            self._pv.first(ply) if score > alpha else move,
+                            depth, ply, score, alpha, beta)
+            return score
@@ -1,8 +1,126 @@
+import time
+
+from game.evaluate import INF
+
+
+class SearchTimeout(Exception):
+    pass
+
+
 class IterativeDeepeningEngineMixin(object):
+    """Search at depth 1, 2, ... maxdepth and play the last PV
+
+    With movetime (seconds) the deepening also stops when the next depth is
+    predicted to end after movetime: its time is the time of the last depth
+    times the effective branching factor (the ratio of the nodes of the last
+    two depths, or of their times with the production stats). With deadline
+    (seconds, movetime by default) the search of a depth is aborted when the
+    deadline is passed, the PV of the last completed depth is played then.
+    The first depth is always completed.
+
+    From the third depth on, the search starts with an aspiration window of
+    aspiration points around the score of two depths before (the scores of
+    odd and even depths differ by more than the window, the side to move at
+    the leaves is not the same). When the score falls out of the window, the
+    window is widened on that side, twice as much each time, and the depth
+    is searched again, through the cache. aspiration=0 searches every depth
+    with the full window.
+    """
+    # the deadline is looked at every CHECK_NODES nodes
+    CHECK_NODES = 256
+
+    def __init__(self, *args, **kwargs):
+        movetime = kwargs.pop('movetime', None)
+        deadline = kwargs.pop('deadline', movetime)
+        self._aspiration = int(kwargs.pop('aspiration', 2))
+        super(IterativeDeepeningEngineMixin, self).__init__(*args, **kwargs)
+        self._movetime = None if movetime is None else float(movetime)
+        self._deadline = None if deadline is None else float(deadline)
+        self._abort_at = None
+        self._ticks = 0
+
     def choose(self, game_problem, board):
-        for depth in range(1, self._maxdepth+1):
+        for depth, pv, score in self.deepen(game_problem,
+                                            self.rootboard(board)):
+            pass
+        return pv[0]
+
+    def initcnt(self):
+        super(IterativeDeepeningEngineMixin, self).initcnt()
+        self._counters['failhighs'] = 0
+        self._counters['faillows'] = 0
+        self._counters['researches'] = 0
+
+    def search_root(self, game_problem, board, depth, guess):
+        """Search board at depth with aspiration windows around guess
+
+        guess is the score of two depths before (None at the first two
+        depths). Returns the score, it is exact.
+        """
+        if guess is None or not self._aspiration:
+            return self.search(game_problem, board, depth)
+
+        delta = self._aspiration
+        alpha, beta = max(guess - delta, -INF), min(guess + delta, INF)
+        while True:
+            score = self.search(game_problem, board, depth, 1, alpha, beta)
+            if alpha < score < beta or (alpha, beta) == (-INF, INF):
+                return score
+            if score <= alpha:
+                self.inc('faillows')
+                alpha = max(score - delta, -INF)
+            else:
+                self.inc('failhighs')
+                beta = min(score + delta, INF)
+            delta *= 2
+            self.inc('researches')
+
+    def deepen(self, game_problem, board, first=1, verbose=True):
+        """Search board at every depth from first to maxdepth
+
+        Yields depth, pv, score after each completed depth. A depth aborted
+        by the deadline leaves board with some moves played.
+        """
+        start = time.time()
+        lastsize = None
+        scores = {}
+        for depth in range(first, self._maxdepth+1):
             self.initcnt()
             self._counters['depth'] = depth
-            pv, score = self.search(board, depth)
-            self.showstats(pv, score)
-        return pv[0]
+            if self._deadline is not None and depth > first:
+                self._abort_at = start + self._deadline
+            try:
+                score = self.search_root(game_problem, board, depth,
+                                         scores.get(depth - 2))
+            except SearchTimeout:
+                return
+            finally:
+                self._abort_at = None
+            scores[depth] = score
+            pv = self.principal_variation(board, depth)
+            if verbose:
+                self.showstats(pv, score)
+
+            now = time.time()
+            predicted = now - self._startt
+            # the growth of the tree from the last depth, by its time when
+            # the nodes are not counted
+            size = self._counters['nodes'] if self._counting else predicted
+            if lastsize:
+                predicted *= float(size) / lastsize
+            lastsize = size
+
+            yield depth, pv, score
+
+            if (self._movetime is not None and
+                    now - start + predicted > self._movetime):
+                return
+
+    def search(self, *args, **kwargs):
+        if self._abort_at is not None:
+            self._ticks += 1
+            if (not self._ticks % self.CHECK_NODES and
+                    time.time() > self._abort_at):
+                raise SearchTimeout()
+        return super(IterativeDeepeningEngineMixin, self).search(*args,
+                                                                 **kwargs)
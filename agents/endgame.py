@@ -0,0 +1,33 @@
+from agents.solver import SolverEngine
+
+# size of the table of the endgame solver
+ENDGAME_MB = 4
+
+
+class EndgameEngineMixin(object):
+    """Solve the positions with few empty squares instead of searching them
+
+    When at most endgame squares are empty the move is chosen by the exact
+    solver (agents.solver), with a small table of its own that is kept from
+    move to move. endgame=0 never solves.
+    """
+    def __init__(self, *args, **kwargs):
+        self._endgame = int(kwargs.pop('endgame', 20))
+        super(EndgameEngineMixin, self).__init__(*args, **kwargs)
+        self._endgame_solver = None
+
+    def endgame_move(self, game_problem, board):
+        """Return the move of the solver, None if too many squares are
+        empty"""
+        if board.cols * board.rows - board.nmoves > self._endgame:
+            return None
+        if self._endgame_solver is None:
+            self._endgame_solver = SolverEngine(self.playing_as,
+                                                cache_mb=ENDGAME_MB)
+        return self._endgame_solver.choose(game_problem, board)
+
+    def choose(self, game_problem, board):
+        move = self.endgame_move(game_problem, board)
+        if move is not None:
+            return move
+        return super(EndgameEngineMixin, self).choose(game_problem, board)
@@ -1,8 +1,9 @@
 import numpy as np
 
-from game.evaldiff import evaldiff
+from game.evaldiff import evaldiff_moves
 from agents.base import Engine
 from game.evaluate import Evaluator, INF
+from problem.utils import PLAYER1, PLAYER2
 
 
 class GreedyEngine(Engine):
@@ -11,19 +12,16 @@ class GreedyEngine(Engine):
 
     def choose(self, game_problem, board):
         moves = game_problem.actions(board)
-        m = moves[0]
-        moves = moves[1:]
 
-        bestmove = m
-        bestscore = -game_problem.evaluate(self.playing_as,
-                                           game_problem.make_action(self.playing_as, m, board))
+        # all the children are evaluated at once, from the side of the
+        # opponent
+        children = board.children_array(moves)
+        scores = -game_problem.evaluate_batch(
+            PLAYER1 if board.to_move != PLAYER1 else PLAYER2, children)
 
-        for m in moves:
-            score = -game_problem.evaluate(self.playing_as,
-                                           game_problem.make_action(self.playing_as, m, board))
-            if score > bestscore:
-                bestmove = m
-                bestscore = score
+        best = scores.argmax()
+        bestmove = moves[best]
+        bestscore = scores[best]
 
         print('Bestscore:', bestscore)
         return bestmove
@@ -50,7 +48,7 @@ class WeightedGreedyEngine(Engine):
             return moves[0]
 
         # winning move or threat blocking?
-        scores = [evaldiff(board, m, self.playing_as) for m in moves]
+        scores = evaldiff_moves(board, moves)
         if max(scores) >= INF - 1:
             return max(zip(scores, moves))[1]
 
@@ -61,7 +59,8 @@ class WeightedGreedyEngine(Engine):
         else:
             weights /= weights.sum()
 
-        selected_move = np.random.choice(moves, p=weights)
+        # a Python int, not a NumPy one (see Position.play)
+        selected_move = int(np.random.choice(moves, p=weights))
 
         if self._verbose:
             selected_score = scores[list(moves).index(selected_move)]
@@ -4,36 +4,45 @@ from collections import defaultdict
 from problem.game_problem import Connect4
 from problem.utils import PLAYER1, PLAYER2, DRAW
 from agents.base import Engine
+from agents.endgame import EndgameEngineMixin
 from agents.greedy import WeightedGreedyEngine
 
 
-class MonteCarloTreeSearch(Engine):
-    def __init__(self, playing_as, simulations=1000, C=1/math.sqrt(2)):
-        super(MonteCarloTreeSearch, self).__init__(playing_as)
+class MonteCarloTreeSearch(EndgameEngineMixin, Engine):
+    def __init__(self, playing_as, simulations=1000, C=1/math.sqrt(2),
+                 **kwargs):
+        super(MonteCarloTreeSearch, self).__init__(playing_as, **kwargs)
         self.simulations = int(simulations)
         self.C = float(C)
-        self.simulation_engine = WeightedGreedyEngine(False)
+        self.simulation_engine = WeightedGreedyEngine(playing_as, verbose=False)
         self._stats = defaultdict(lambda: [0, 0])
 
     def choose(self, game_problem, board):
+        # the mixin does not come before this choose
+        move = self.endgame_move(game_problem, board)
+        if move is not None:
+            return move
+
         stats, depth = self.search(game_problem, board, self.simulations, self.C)
         return self.select_best_move(stats, depth, game_problem, board)
 
     def search(self, game_problem, board, simulations, C):
         stats = self._stats
-        root = board
+        # the tree is walked making and taking back moves on a single board
+        node = board.copy()
         max_depth = 0
 
         for i in range(simulations):
-            node = root
             states = []
 
             # select leaf node
             depth = 0
-            while game_problem.is_terminal(node) is None:
+            end = game_problem.is_terminal(node)
+            while end is None:
                 depth += 1
                 move, select = self.select_next_move(stats, game_problem, node, C)
-                node = game_problem.make_action(self.playing_as, move, node)
+                node.push(move)
+                end = game_problem.is_terminal(node)
                 states.append(Connect4.hashkey(node)[0])
 
                 if not select:
@@ -42,13 +51,12 @@ class MonteCarloTreeSearch(Engine):
             max_depth = max(depth, max_depth)
 
             # run.py simulation if not at the end of the game tree
-            if game_problem.is_terminal(node) is None:
+            if end is None:
                 result = self.simulate(game_problem, node)
+            elif end == DRAW:
+                result = 0.5
             else:
-                if game_problem.is_terminal(node) == 0:
-                    result = 0.5
-                else:
-                    result = 0
+                result = 0
 
             # propagate results
             for state in reversed(states):
@@ -56,20 +64,36 @@ class MonteCarloTreeSearch(Engine):
                 stats[state][0] += 1
                 stats[state][1] += result
 
+            # back to the root
+            for x in range(depth):
+                node.pop()
+
         return stats, max_depth
 
     def get_next_to_move(self, whose_turn):
         return PLAYER1 if whose_turn != PLAYER1 else PLAYER2
 
     def simulate(self, game_problem, board):
+        """Play the game out with the simulation engine, return the result
+        for the side to move in board
+
+        The moves are played on board and taken back before returning.
+        """
         engine = self.simulation_engine
-        node = board
-        while game_problem.is_terminal(node) is None:
-            m = engine.choose(game_problem, node)
-            node = game_problem.make_action(self.playing_as, m, node)
-        if game_problem.is_terminal(node) == DRAW:
+        to_move = board.to_move
+        played = 0
+        end = game_problem.is_terminal(board)
+        while end is None:
+            board.push(engine.choose(game_problem, board))
+            played += 1
+            end = game_problem.is_terminal(board)
+
+        for x in range(played):
+            board.pop()
+
+        if end == DRAW:
             return 0.5
-        elif game_problem.is_terminal(node) == self.get_next_to_move(self.playing_as):
+        elif end == to_move:
             return 1
         else:
             return 0
@@ -80,8 +104,11 @@ class MonteCarloTreeSearch(Engine):
         bestscore = None
         bestmove = None
 
-        children = [(m, stats[game_problem.hashkey(game_problem.make_action(self.playing_as, m, board))[0]])
-                    for m in game_problem.actions(board)]
+        children = []
+        for m in game_problem.actions(board):
+            board.push(m)
+            children.append((m, stats[game_problem.hashkey(board)[0]]))
+            board.pop()
         total_n = sum(x[0] for (_, x) in children)
 
         for child_move, child_stat in children:
@@ -106,7 +133,9 @@ class MonteCarloTreeSearch(Engine):
         moves = game_problem.actions(board)
 
         for m in moves:
-            n, w = stats[Connect4.hashkey(game_problem.make_action(self.playing_as, m, board))[0]]
+            board.push(m)
+            n, w = stats[Connect4.hashkey(board)[0]]
+            board.pop()
             total_n += n
             print('Move %d score: %d/%d (%0.1f%%)' % (m+1, w, n, w/n*100))
             if n > bestscore or (n == bestscore and random.random() <= 0.5):
@@ -0,0 +1,72 @@
+"""MTD(f): iterative deepening with null window searches only
+
+Every depth is searched by a series of null window alpha-beta searches
+through the cache, each one telling whether the score is above or below a
+test value, until the lower and the upper bound of the score meet. The
+first test value is the score of two depths before (the scores of odd and
+even depths are apart).
+
+AlphaBetaEngine.search fails hard on the low side: a search failing low
+only tells that the score is below the test value, so the bounds would be
+walked one point at a time toward a mate score. The step between two test
+values is doubled while the searches keep failing on the same side, and
+brought back to one point when they change side.
+"""
+from game.evaluate import INF
+from agents.alphabeta import AlphaBetaEngine
+from agents.book import BookEngineMixin
+from agents.cached import CachedEngineMixin
+from agents.deepening import IterativeDeepeningEngineMixin
+
+
+class MTDFEngine(BookEngineMixin, CachedEngineMixin,
+                 IterativeDeepeningEngineMixin, AlphaBetaEngine):
+    # the PV of the last search failing high at the root
+    _bestpv = None
+
+    FORMAT_STAT = (
+        '[depth: {depth}] score: {score} [time: {time:0.3f}s, pv: {pv}]\n' +
+        'nps: {nps}, nodes: {nodes}, betacuts: {betacuts} ' +
+        '(first move: {firstcuts})\n' +
+        'hits: {hits}, leaves: {leaves}, qnodes: {qnodes}, ' +
+        'draws: {draws}, mates: {mates}\n' +
+        'passes: {passes}'
+        )
+
+    def initcnt(self):
+        super(MTDFEngine, self).initcnt()
+        self._counters['hits'] = 0
+        self._counters['passes'] = 0
+
+    def search_root(self, game_problem, board, depth, guess):
+        lower, upper = -INF, INF
+        beta = guess if guess is not None else 0
+        step = 1
+        side = None
+        pv = self._bestpv = None
+        while lower < upper:
+            self.inc('passes')
+            score = self.search(game_problem, board, depth, 1, beta - 1, beta)
+            if score >= beta:
+                # only a search failing high has a move reaching its score
+                lower = score
+                pv = super(MTDFEngine, self).principal_variation(board, depth)
+                step = step * 2 if side == 'high' else 1
+                side = 'high'
+                beta = min(lower + step, upper)
+            else:
+                upper = score
+                step = step * 2 if side == 'low' else 1
+                side = 'low'
+                beta = max(upper - step + 1, lower + 1)
+        self._bestpv = pv
+        return lower
+
+    def principal_variation(self, board, depth):
+        # the last pass may fail low
+        if self._bestpv is not None:
+            return self._bestpv
+        return super(MTDFEngine, self).principal_variation(board, depth)
+
+    def __str__(self):
+        return 'MTDF(%s)' % self._maxdepth
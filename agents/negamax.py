@@ -1,8 +1,12 @@
+import json
 import time
 from collections import defaultdict
 
-from problem.utils import DRAW
+from problem.utils import PLAYER1, PLAYER2, DRAW
+from problem.position import CountingPosition
 from game.evaluate import INF
+from game.pv import PVTable
+from game.stats import MODES, new_profile, report
 from agents.greedy import GreedyEngine
 
 
@@ -12,18 +16,51 @@ class NegamaxEngine(GreedyEngine):
         'nps: {nps}, nodes: {nodes}, leaves: {leaves}, draws: {draws}, mates: {mates}'
         )
 
-    def __init__(self, play_as, maxdepth=4):
+    def __init__(self, play_as, maxdepth=4, evaluation='bitboard',
+                 stats='counters', profile_path=None):
         super(NegamaxEngine, self).__init__(play_as)
         self._maxdepth = int(maxdepth)
+        if evaluation not in ('bitboard', 'incremental'):
+            raise ValueError('Unknown evaluation: %s' % evaluation)
+        self._evaluation = evaluation
+        self._pv = PVTable()
+        if stats not in MODES:
+            raise ValueError('Unknown stats: %s' % stats)
+        self._stats = stats
+        # the searches only call inc for the counters of the nodes when
+        # counting (see game.stats)
+        self._counting = stats != 'production'
+        # with a path the profiles are appended to it, one JSON line per
+        # search, otherwise they are printed
+        self._profile_path = profile_path
+        self._profile = None
+        if stats == 'profile':
+            self.inc = self.inc_profile
 
     def choose(self, game_problem, board):
         self.initcnt()
-        pv, score = self.search(game_problem, board, self._maxdepth)
+        board = self.rootboard(board)
+        score = self.search(game_problem, board, self._maxdepth)
+        pv = self.principal_variation(board, self._maxdepth)
 
         self.showstats(pv, score)
         
         return pv[0]
 
+    def rootboard(self, board):
+        """Return the copy of board the search makes and takes back its
+        moves on
+
+        With the 'incremental' evaluation the copy keeps its segment
+        histograms updated move by move, instead of having them computed
+        from scratch at every leaf.
+        """
+        # a node for every empty square, from ply 1
+        self._pv.reserve(board.cols * board.rows + 2)
+        if self._evaluation == 'incremental':
+            return CountingPosition.from_position(board)
+        return board.copy()
+
     def initcnt(self):
         self._startt = time.time()
         self._counters = cnt = defaultdict(int)
@@ -31,9 +68,36 @@ class NegamaxEngine(GreedyEngine):
         cnt['leaves'] = 0
         cnt['draws'] = 0
         cnt['mates'] = 0
+        if self._stats == 'profile':
+            self._profile = new_profile()
+
+    def inc(self, cnt, index=None):
+        self._counters[cnt] += 1
 
-    def inc(self, cnt):
+    def inc_profile(self, cnt, index=None):
+        """inc of the profile setting, the counts by index are kept too"""
         self._counters[cnt] += 1
+        if index is not None:
+            self._profile[cnt][index] += 1
+
+    def snapshot(self):
+        """Return the counters and the profile in plain dicts, to send them
+        to another process"""
+        profile = None
+        if self._profile is not None:
+            profile = dict((cnt, dict(counts))
+                           for cnt, counts in self._profile.items())
+        return dict(self._counters), profile
+
+    def addcnt(self, snapshot):
+        """Add the counts of a snapshot to the ones of this engine"""
+        counters, profile = snapshot
+        for cnt, value in counters.items():
+            self._counters[cnt] += value
+        if profile is not None and self._profile is not None:
+            for cnt, counts in profile.items():
+                for index, value in counts.items():
+                    self._profile[cnt][index] += value
 
     def showstats(self, pv, score):
         t = time.time() - self._startt
@@ -49,40 +113,104 @@ class NegamaxEngine(GreedyEngine):
         ctx['nps'] = nps
         ctx['score'] = score
         ctx['time'] = t
-        
+
+        if self._stats == 'production':
+            # the first line: score, time and PV
+            print(self.FORMAT_STAT.split('\n', 1)[0].format(**ctx))
+            return
+
         print(self.FORMAT_STAT.format(**ctx))
+
+        if self._stats == 'profile':
+            data = json.dumps(report(
+                self._counters, self._profile,
+                self._counters.get('depth', self._maxdepth), t),
+                sort_keys=True)
+            if self._profile_path is None:
+                print(data)
+            else:
+                with open(self._profile_path, 'a') as f:
+                    f.write(data + '\n')
     
+    def principal_variation(self, board, depth):
+        """Return the PV of the last search of board at depth"""
+        return self._pv.line(1)
+
     def search(self, game_problem, board, depth, ply=1):
-        self.inc('nodes')
+        """Return the score of board, its PV is left in the row ply of the
+        PV table"""
+        if self._counting:
+            self.inc('nodes', ply)
 
-        if game_problem.is_terminal(board) is not None:
-            return self.endscore(game_problem, board, ply)
+        end = game_problem.is_terminal(board)
+        if end is not None:
+            return self.endscore(end, ply)
 
         if depth <= 0:
-            self.inc('leaves')
-            return [], game_problem.evaluate(self.playing_as, board)
+            if self._counting:
+                self.inc('leaves')
+            self._pv.clear(ply)
+            return game_problem.evaluate(board.to_move, board)
+
+        decided, forced = self.tactics(board, depth, ply)
+        if decided is not None:
+            return decided
 
-        bestmove = []
         bestscore = -INF
-        for m in game_problem.actions(board):
-            nextmoves, score = self.search(game_problem,
-                                           game_problem.make_action(self.playing_as, m, board),
-                                           depth - 1, ply + 1)
-            score = -score
-            if not bestmove or score >= bestscore:
+        for m in forced or game_problem.actions(board):
+            board.push(m)
+            score = -self.search(game_problem, board, depth - 1, ply + 1)
+            board.pop()
+            # the scores are above -INF, the first move is always kept
+            if score >= bestscore:
                 bestscore = score
-                bestmove = [m] + nextmoves
-
-        return bestmove, bestscore
-
-    def endscore(self, game_problem, board, ply):
-        self.inc('leaves')
-        if game_problem.is_terminal(board) == DRAW:
-            self.inc('draws')
-            return [], 0
+                self._pv.update(ply, m)
+
+        return bestscore
+
+    def tactics(self, board, depth, ply):
+        """Look for the wins in one move of both sides
+
+        Returns (decided, forced): decided is the score when the side to
+        move wins with its next chip, or when the opponent has two winning
+        squares and depth >= 2, its PV is then in the row ply of the PV
+        table. forced is the column blocking the only winning square of the
+        opponent when depth >= 2. Otherwise both are None, the results are
+        the same as the ones of the search.
+        """
+        height = board.geometry.height
+        wins = board.winning_squares(board.to_move)
+        if wins:
+            self._pv.clear(ply + 1)
+            self._pv.update(ply, ((wins & -wins).bit_length() - 1) // height)
+            return INF - ply - 1, None
+        if depth < 2:
+            return None, None
+        threats = board.winning_squares(
+            PLAYER1 if board.to_move != PLAYER1 else PLAYER2)
+        if not threats:
+            return None, None
+        first = (threats & -threats).bit_length() - 1
+        if threats & (threats - 1):
+            second = (threats ^ (1 << first)).bit_length() - 1
+            self._pv.clear(ply + 2)
+            self._pv.update(ply + 1, second // height)
+            self._pv.update(ply, first // height)
+            return -(INF - ply - 2), None
+        return None, [first // height]
+
+    def endscore(self, end, ply):
+        self._pv.clear(ply)
+        if end == DRAW:
+            if self._counting:
+                self.inc('leaves')
+                self.inc('draws')
+            return 0
         else:
-            self.inc('mates')
-            return [], -(INF - ply)
+            if self._counting:
+                self.inc('leaves')
+                self.inc('mates')
+            return -(INF - ply)
 
     def __str__(self):
         return 'Negamax(%s)' % self._maxdepth
@@ -1,55 +1,120 @@
 from game.evaluate import INF
+from problem.utils import PLAYER1, PLAYER2
 from agents.alphabeta import AlphaBetaEngine
+from agents.book import BookEngineMixin
 from agents.cached import CachedEngineMixin
 from agents.deepening import IterativeDeepeningEngineMixin
+from agents.endgame import EndgameEngineMixin
+from agents.rootsplit import RootSplitEngineMixin
+from agents.ybw import YBWEngineMixin
+from agents.smp import LazySMPEngineMixin
 
 
 class PVSEngine(AlphaBetaEngine):
+    FORMAT_STAT = (
+        'score: {score} [time: {time:0.3f}s, pv: {pv}]\n' +
+        'nps: {nps}, nodes: {nodes}, betacuts: {betacuts} ' +
+        '(first move: {firstcuts})\n' +
+        'leaves: {leaves}, qnodes: {qnodes}, draws: {draws}, ' +
+        'mates: {mates}\n' +
+        'reductions: {reductions} (re-searched: {reresearches})'
+        )
+
+    def __init__(self, play_as, maxdepth=4, ordering='seq',
+                 evaluation='bitboard', quiescence=8, reduction=0,
+                 reduce_after=3, reduce_depth=3, stats='counters',
+                 profile_path=None):
+        super(PVSEngine, self).__init__(play_as, maxdepth, ordering,
+                                        evaluation, quiescence, stats,
+                                        profile_path)
+        # late move reductions: the moves after the first reduce_after ones
+        # are searched reduction plies less deep when depth is at least
+        # reduce_depth, and searched again at full depth if they beat alpha.
+        # The first move is never reduced, a reduced search is not deeper
+        # than a leaf.
+        if int(reduction) < 0:
+            raise ValueError('Negative reduction: %s' % reduction)
+        self._reduction = int(reduction)
+        self._reduce_after = max(1, int(reduce_after))
+        self._reduce_depth = int(reduce_depth)
+
+    def initcnt(self):
+        super(PVSEngine, self).initcnt()
+        self._counters['reductions'] = 0
+        self._counters['reresearches'] = 0
+
+    def reduce(self, board, i, depth, forced):
+        """Return whether the move just played, the ith one, is reduced
+
+        Forced moves and the moves that make a threat the opponent must
+        block are never reduced.
+        """
+        return (self._reduction and i >= self._reduce_after and
+                depth >= self._reduce_depth and forced is None and
+                not board.winning_squares(
+                    PLAYER1 if board.to_move != PLAYER1 else PLAYER2))
+
     def search(self, game_problem, board, depth, ply=1, alpha=-INF, beta=INF, hint=None):
-        self.inc('nodes')
+        if self._counting:
+            self.inc('nodes', ply)
 
-        if game_problem.is_terminal(board) is not None:
-            return self.endscore(game_problem, board, ply)
+        end = game_problem.is_terminal(board)
+        if end is not None:
+            return self.endscore(end, ply)
 
         if depth <= 0:
-            self.inc('leaves')
-            return [], game_problem.evaluate(self.playing_as, board)
+            if self._counting:
+                self.inc('leaves')
+            return self.quiesce(game_problem, board, ply)
+
+        decided, forced = self.tactics(board, depth, ply)
+        if decided is not None:
+            return decided
 
-        bestmove = []
         bestscore = alpha
-        for i, m in enumerate(self.moveorder(board, game_problem.actions(board), hint)):
+        for i, m in enumerate(forced or self.moveorder(board, game_problem.actions(board), hint)):
+            board.push(m)
+            if self.reduce(board, i, depth, forced):
+                if self._counting:
+                    self.inc('reductions')
+                score = -self.search(game_problem, board,
+                                     max(0, depth - 1 - self._reduction),
+                                     ply + 1, -bestscore - 1, -bestscore)
+                if score <= bestscore:
+                    board.pop()
+                    continue
+                if self._counting:
+                    self.inc('reresearches')
+
             if i == 0 or depth == 1 or (beta-alpha) == 1:
-                nextmoves, score = self.search(game_problem,
-                                               game_problem.make_action(self.playing_as, m, board),
-                                               depth - 1, ply + 1,
-                                               -beta, -bestscore)
+                score = -self.search(game_problem, board, depth - 1, ply + 1,
+                                     -beta, -bestscore)
             else:
                 # pvs uses a zero window for all the other searches
-                _, score = self.search(game_problem,
-                                       game_problem.make_action(self.playing_as, m, board),
-                                       depth - 1, ply + 1,
-                                       -bestscore - 1, -bestscore)
-                score = -score
+                score = -self.search(game_problem, board, depth - 1, ply + 1,
+                                     -bestscore - 1, -bestscore)
                 if score > bestscore:
-                    nextmoves, score = self.search(game_problem,
-                                                   game_problem.make_action(self.playing_as, m, board),
-                                                   depth - 1, ply + 1,
-                                                   -beta, -bestscore)
+                    score = -self.search(game_problem, board,
+                                         depth - 1, ply + 1,
+                                         -beta, -bestscore)
                 else:
+                    board.pop()
                     continue
+            board.pop()
 
-            score = -score
             if score > bestscore:
                 bestscore = score
-                bestmove = [m] + nextmoves
-            elif not bestmove:
-                bestmove = [m] + nextmoves
+                self._pv.update(ply, m)
 
             if bestscore >= beta:
-                self.inc('betacuts')
+                if self._counting:
+                    self.inc('betacuts', i)
+                    if i == 0:
+                        self.inc('firstcuts')
+                self.cutoff(board, m, depth)
                 break
 
-        return bestmove, bestscore
+        return bestscore
 
     def __str__(self):
         return 'PVS(%s)' % self._maxdepth
@@ -58,8 +123,11 @@ class PVSEngine(AlphaBetaEngine):
 class PVSCachedEngine(CachedEngineMixin, PVSEngine):
     FORMAT_STAT = (
         'score: {score} [time: {time:0.3f}s, pv: {pv}]\n' +
-        'nps: {nps}, nodes: {nodes}, betacuts: {betacuts}\n' +
-        'hits: {hits}, leaves: {leaves}, draws: {draws}, mates: {mates}'
+        'nps: {nps}, nodes: {nodes}, betacuts: {betacuts} ' +
+        '(first move: {firstcuts})\n' +
+        'hits: {hits}, leaves: {leaves}, qnodes: {qnodes}, ' +
+        'draws: {draws}, mates: {mates}\n' +
+        'reductions: {reductions} (re-searched: {reresearches})'
         )
 
     def initcnt(self):
@@ -70,11 +138,18 @@ class PVSCachedEngine(CachedEngineMixin, PVSEngine):
         return 'PVSCache(%s)' % self._maxdepth
 
 
-class PVSDeepEngine(CachedEngineMixin, IterativeDeepeningEngineMixin, PVSEngine):
+class PVSDeepEngine(BookEngineMixin, EndgameEngineMixin, LazySMPEngineMixin,
+                    CachedEngineMixin, IterativeDeepeningEngineMixin,
+                    PVSEngine):
     FORMAT_STAT = (
         '[depth: {depth}] score: {score} [time: {time:0.3f}s, pv: {pv}]\n' +
-        'nps: {nps}, nodes: {nodes}, betacuts: {betacuts}\n' +
-        'hits: {hits}, leaves: {leaves}, draws: {draws}, mates: {mates}'
+        'nps: {nps}, nodes: {nodes}, betacuts: {betacuts} ' +
+        '(first move: {firstcuts})\n' +
+        'hits: {hits}, leaves: {leaves}, qnodes: {qnodes}, ' +
+        'draws: {draws}, mates: {mates}\n' +
+        'failhighs: {failhighs}, faillows: {faillows}, ' +
+        'researches: {researches}\n' +
+        'reductions: {reductions} (re-searched: {reresearches})'
         )
 
     def initcnt(self):
@@ -83,3 +158,19 @@ class PVSDeepEngine(CachedEngineMixin, IterativeDeepeningEngineMixin, PVSEngine)
 
     def __str__(self):
         return 'PVSDeep(%s)' % self._maxdepth
+
+
+class PVSSplitEngine(RootSplitEngineMixin, PVSEngine):
+    def __str__(self):
+        return 'PVSSplit(%s)' % self._maxdepth
+
+
+class PVSYBWEngine(CachedEngineMixin, YBWEngineMixin, PVSEngine):
+    FORMAT_STAT = PVSCachedEngine.FORMAT_STAT
+
+    def initcnt(self):
+        super(PVSYBWEngine, self).initcnt()
+        self._counters['hits'] = 0
+
+    def __str__(self):
+        return 'PVSYBW(%s)' % self._maxdepth
@@ -0,0 +1,76 @@
+"""Root splitting: the root moves are searched in parallel by a process pool
+
+The best score found so far is shared by the workers, a root move is searched
+with it as alpha so that the moves that can not be better fail low quickly.
+The window is opened by one point below the shared alpha: a move as good as
+the best one still gets its exact score, and ties are broken by the move
+order like in the serial search, which gives the same move and score.
+
+The pool is created (forked) at every move, with the engine and the board
+given to the workers at their start.
+"""
+import ctypes
+import multiprocessing
+
+from game.evaluate import INF
+
+# set in every worker by _init_worker
+_worker = {}
+
+
+def _init_worker(engine, game_problem, board, depth, alpha):
+    _worker.update(engine=engine, game_problem=game_problem, board=board,
+                   depth=depth, alpha=alpha)
+
+
+def _search_root_move(m):
+    engine = _worker['engine']
+    board = _worker['board']
+    alpha = _worker['alpha']
+
+    engine.initcnt()
+    board.push(m)
+    score = -engine.search(_worker['game_problem'], board,
+                           _worker['depth'] - 1, 2, -INF, -(alpha.value - 1))
+    board.pop()
+
+    with alpha.get_lock():
+        if score > alpha.value:
+            alpha.value = score
+    return m, [m] + engine._pv.line(2), score, engine.snapshot()
+
+
+class RootSplitEngineMixin(object):
+    def __init__(self, *args, **kwargs):
+        self._workers = int(kwargs.pop('workers', multiprocessing.cpu_count()))
+        super(RootSplitEngineMixin, self).__init__(*args, **kwargs)
+
+    def choose(self, game_problem, board):
+        if self._workers <= 1:
+            return super(RootSplitEngineMixin, self).choose(game_problem,
+                                                            board)
+
+        self.initcnt()
+        board = self.rootboard(board)
+        moves = list(self.moveorder(board, game_problem.actions(board)))
+
+        alpha = multiprocessing.Value(ctypes.c_int64, -INF)
+        pool = multiprocessing.Pool(self._workers, _init_worker,
+                                    (self, game_problem, board,
+                                     self._maxdepth, alpha))
+        try:
+            results = pool.map(_search_root_move, moves, chunksize=1)
+        finally:
+            pool.terminate()
+            pool.join()
+
+        bestpv, bestscore = None, None
+        for m, pv, score, counts in results:
+            self.addcnt(counts)
+            if bestpv is None or score > bestscore:
+                bestpv, bestscore = pv, score
+        if self._counting:
+            self.inc('nodes', 1)
+
+        self.showstats(bestpv, bestscore)
+        return bestpv[0]
@@ -0,0 +1,88 @@
+"""Lazy SMP: parallel iterative deepening over a shared transposition table
+
+With threads > 1, threads - 1 helper processes are forked at every move.
+They run the same iterative deepening search as the main process, half of
+them one depth ahead and the others with a random move ordering, and they
+all store their results in one SharedCache. The helpers do not talk to each
+other: they only make the main search find more of its subtrees already in
+the table. The deepest PV completed by any process is returned.
+
+Helpers are forked, the engine is not pickled: this needs the fork start
+method of multiprocessing (Linux, macOS with Python 2).
+"""
+import ctypes
+import multiprocessing
+import os
+import random
+
+from game.cache import SharedCache
+from game.moveorder import MoveOrder
+
+
+class LazySMPEngineMixin(object):
+    def __init__(self, *args, **kwargs):
+        self._threads = int(kwargs.pop('threads', 1))
+        if self._threads > 1:
+            self._cache_class = SharedCache
+        super(LazySMPEngineMixin, self).__init__(*args, **kwargs)
+
+    def choose(self, game_problem, board):
+        if self._threads <= 1:
+            return super(LazySMPEngineMixin, self).choose(game_problem, board)
+
+        self._cache.new_search()
+        board = self.rootboard(board)
+
+        results, width = self._results(board)
+        helpers = [multiprocessing.Process(target=self._helper,
+                                           args=(game_problem, board, i,
+                                                 results, width))
+                   for i in range(1, self._threads)]
+        for helper in helpers:
+            helper.daemon = True
+            helper.start()
+
+        try:
+            bestdepth, pv = 0, []
+            for depth, pv, score in self.deepen(game_problem, board):
+                bestdepth = depth
+        finally:
+            for helper in helpers:
+                helper.terminate()
+            for helper in helpers:
+                helper.join()
+
+        for i in range(1, self._threads):
+            offset = i * width
+            depth = results[offset]
+            if depth > bestdepth:
+                bestdepth = depth
+                pv = results[offset + 3:offset + 3 + results[offset + 2]]
+
+        return pv[0]
+
+    def _results(self, board):
+        """Return the shared array of the results of the helpers and the
+        width of a slot
+
+        A slot holds the completed depth, the score, the length of the PV
+        and the PV of a helper, the depth is written last. The quiescence
+        and the wins found by tactics make the PV longer than the depth, it
+        is at most the number of squares.
+        """
+        width = board.cols * board.rows + 3
+        return (multiprocessing.RawArray(ctypes.c_int64,
+                                         width * self._threads), width)
+
+    def _helper(self, game_problem, board, i, results, width):
+        random.seed(os.getpid())
+        if i % 2 == 0:
+            self.moveorder = MoveOrder('random').order
+        offset = i * width
+        for depth, pv, score in self.deepen(game_problem, board,
+                                            first=1 + i % 2, verbose=False):
+            results[offset] = 0
+            results[offset + 1] = int(score)
+            results[offset + 2] = len(pv)
+            results[offset + 3:offset + 3 + len(pv)] = pv
+            results[offset] = depth
@@ -0,0 +1,264 @@
+"""Perfect play: the exact score of a position, searched to the end of the game
+
+The score of a position is 0 for a draw. When the side to move wins with
+its chip number n (counting the chips of both players, the first chip of
+the game being number 1) the score is (size + 2 - n) // 2, size being the
+number of squares: the sooner the win, the higher the score. A loss has the
+opposite score of the win of the opponent.
+
+Positions are two integer bitmasks with the layout of problem.position:
+current (the chips of the side to move) and mask (all the chips). The
+search is a negamax with alpha-beta pruning that only looks at the moves
+that do not give the opponent a win at once, tries first the ones that
+make the most winning squares (then the central columns first), and keeps
+the upper bounds of the scores in a transposition table. The root is
+solved by null window searches narrowing the interval of the score.
+"""
+import time
+from operator import itemgetter
+
+from agents.base import Engine
+from agents.book import BookEngineMixin
+from problem.position import geometry
+
+# bytes per transposition table entry: a list slot and an int object
+ENTRY_BYTES = 32
+# the flag of the entries keeping a lower bound, the others keep an upper
+# bound
+LOWER = 0x100
+
+
+class Solver(object):
+    def __init__(self, cols=7, rows=6, cache_mb=64):
+        geo = geometry(cols, rows)
+        self.cols = cols
+        self.size = cols * rows
+        self.height = geo.height
+        self.bottom = geo.bottom
+        self.full = geo.full
+        self.column_masks = [((1 << rows) - 1) << (c * geo.height)
+                             for c in range(cols)]
+        # the columns from the center to the sides
+        self.order = sorted(range(cols), key=lambda c: abs(2 * c - cols + 1))
+        self.order_masks = [self.column_masks[c] for c in self.order]
+        # the entries are key << 9 | LOWER or 0 | (bound + size), the size
+        # of the table is odd so that the keys are spread on all the slots
+        self._entries = (int(cache_mb * 2 ** 20) // ENTRY_BYTES) | 1
+        self._table = [0] * self._entries
+        self._winning = geo.winning
+        self.nodes = 0
+
+    def clear(self):
+        self._table = [0] * self._entries
+
+    def winning_squares(self, position, mask):
+        """Return the free squares that would make four with position"""
+        return self._winning(position, self.full ^ mask)
+
+    def can_win_next(self, current, mask):
+        return bool(self.winning_squares(current, mask) &
+                    (mask + self.bottom) & self.full)
+
+    def nonlosing_moves(self, current, mask):
+        """Return the mask of the playable squares that do not lose at once
+
+        Returns 0 when all the moves lose.
+        """
+        possible = (mask + self.bottom) & self.full
+        threats = self.winning_squares(current ^ mask, mask)
+        forced = possible & threats
+        if forced:
+            if forced & (forced - 1):
+                # two threats of the opponent
+                return 0
+            possible = forced
+        # not under a square the opponent wins on
+        return possible & ~(threats >> 1)
+
+    def negamax(self, current, mask, moves, alpha, beta):
+        """Return the score of the position if it is within (alpha, beta)
+
+        Otherwise return an upper bound (<= alpha) or a lower bound
+        (>= beta) of the score. The side to move can not win at once.
+        """
+        self.nodes += 1
+        size = self.size
+
+        winning = self._winning
+        free = self.full ^ mask
+
+        # the moves that do not lose at once (see nonlosing_moves)
+        possible = (mask + self.bottom) & self.full
+        threats = winning(current ^ mask, free)
+        forced = possible & threats
+        if forced:
+            if forced & (forced - 1):
+                return -((size - moves) // 2)
+            possible = forced
+        possible &= ~(threats >> 1)
+        if not possible:
+            return -((size - moves) // 2)
+        if moves >= size - 2:
+            return 0
+
+        # the opponent can not win with its next chip
+        lowest = -((size - 2 - moves) // 2)
+        if alpha < lowest:
+            alpha = lowest
+            if alpha >= beta:
+                return alpha
+        # the side to move can not win with its next chip
+        highest = (size - 1 - moves) // 2
+        if beta > highest:
+            beta = highest
+            if alpha >= beta:
+                return beta
+
+        key = current + mask
+        table = self._table
+        slot = key % self._entries
+        entry = table[slot]
+        if entry and entry >> 9 == key:
+            bound = (entry & 0xff) - size
+            if entry & LOWER:
+                if alpha < bound:
+                    alpha = bound
+                    if alpha >= beta:
+                        return alpha
+            elif beta > bound:
+                beta = bound
+                if alpha >= beta:
+                    return beta
+
+        children = []
+        for column_mask in self.order_masks:
+            move = possible & column_mask
+            if move:
+                children.append((bin(winning(current | move, free)).count('1'),
+                                 move))
+        if len(children) > 1:
+            children.sort(key=itemgetter(0), reverse=True)
+
+        opponent = current ^ mask
+        for _, move in children:
+            score = -self.negamax(opponent, mask | move, moves + 1,
+                                  -beta, -alpha)
+            if score >= beta:
+                table[slot] = key << 9 | LOWER | (score + size)
+                return score
+            if score > alpha:
+                alpha = score
+
+        table[slot] = key << 9 | (alpha + size)
+        return alpha
+
+    def solve(self, current, mask, moves):
+        """Return the exact score of the position"""
+        size = self.size
+        if self.can_win_next(current, mask):
+            return (size + 1 - moves) // 2
+        lower = -((size - moves) // 2)
+        upper = (size + 1 - moves) // 2
+        while lower < upper:
+            # search near 0 first, the null windows far from the score are
+            # the cheap ones
+            med = lower + (upper - lower) // 2
+            if med <= 0 and int(lower / 2.) < med:
+                med = int(lower / 2.)
+            elif med >= 0 and int(upper / 2.) > med:
+                med = int(upper / 2.)
+            score = self.negamax(current, mask, moves, med, med + 1)
+            if score <= med:
+                upper = score
+            else:
+                lower = score
+        return lower
+
+    def plies(self, score, moves):
+        """Return the number of plies left to the end of the game
+
+        score is the score of a position with moves chips.
+        """
+        if score == 0:
+            return self.size - moves
+        # the number of chips before the winning one, it has the parity of
+        # the winner
+        parity = moves & 1 if score > 0 else (moves + 1) & 1
+        chips = self.size + 1 - 2 * abs(score)
+        if chips & 1 != parity:
+            chips -= 1
+        return chips + 1 - moves
+
+
+class SolverEngine(BookEngineMixin, Engine):
+    FORMAT_STAT = (
+        'score: {score} ({result} in {plies} plies) [time: {time:0.3f}s, ' +
+        'move: {move}]\n' +
+        'nps: {nps}, nodes: {nodes}'
+        )
+
+    def __init__(self, play_as, cache_mb=64, **kwargs):
+        super(SolverEngine, self).__init__(play_as, **kwargs)
+        self._cache_mb = cache_mb
+        self._solver = None
+
+    def solver(self, board):
+        solver = self._solver
+        if solver is None or (solver.cols, solver.size) != (
+                board.cols, board.cols * board.rows):
+            solver = self._solver = Solver(board.cols, board.rows,
+                                           self._cache_mb)
+        return solver
+
+    def solve(self, board):
+        """Return the best move of board and its exact score"""
+        solver = self.solver(board)
+        current = board.masks[board.to_move]
+        mask = board.masks[0]
+        moves = board.nmoves
+        height = solver.height
+
+        score = solver.solve(current, mask, moves)
+
+        playable = (mask + solver.bottom) & solver.full
+        if score > 0 and score == (solver.size + 1 - moves) // 2:
+            winning = solver.winning_squares(current, mask) & playable
+            for c in solver.order:
+                if winning & solver.column_masks[c]:
+                    return c, score
+
+        # the first move whose child is at most -score: a null window
+        # search on each child, most are cut at once
+        candidates = solver.nonlosing_moves(current, mask) or playable
+        for c in solver.order:
+            move = candidates & solver.column_masks[c]
+            if not move:
+                continue
+            child = solver.negamax(current ^ mask, mask | move, moves + 1,
+                                   -score, -score + 1)
+            if -child >= score:
+                return c, score
+        # not reached: some move reaches the score of the position
+        raise AssertionError('no move reaches the score %d' % score)
+
+    def choose(self, game_problem, board):
+        solver = self.solver(board)
+        solver.nodes = 0
+        start = time.time()
+        move, score = self.solve(board)
+        t = time.time() - start
+
+        if score > 0:
+            result = 'win'
+        elif score < 0:
+            result = 'loss'
+        else:
+            result = 'draw'
+        print(self.FORMAT_STAT.format(
+            score=score, result=result,
+            plies=solver.plies(score, board.nmoves), time=t, move=move + 1,
+            nps=solver.nodes / t if t else 0, nodes=solver.nodes))
+        return move
+
+    def __str__(self):
+        return 'Solver'
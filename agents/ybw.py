@@ -0,0 +1,311 @@
+"""Young Brothers Wait: parallel PVS splitting the nodes near the root
+
+At a node with at least split_depth plies left, the first move is searched
+first (by the process that owns the node), then the other moves (the
+younger brothers) become jobs pending in the owner. The owner goes on with
+them in order, and a process that has nothing to do asks a random process
+for work: that process hands over its oldest pending job, the one nearest
+to the root, at its next check (every CHECK_NODES nodes or while it waits).
+A job searches its move with a null window on the best score of the node,
+and searches again with the full window when it fails high, like
+PVSEngine.search does. The best score of every split node is shared, a job
+starts with the one of the moment.
+
+When a job gives a beta cutoff its node is cancelled: the jobs of the node
+are dropped and the searches under the node stop at their next check.
+
+The engine is cached (CachedEngineMixin comes before this mixin, the split
+nodes are looked up too), with workers > 1 the table is a SharedCache: the
+subtrees a job shares with the searches of the other processes are found in
+it. A cancelled search stores nothing, only completed subtrees are kept.
+
+The node overhead is not always under the 30% aimed at: at depth 8 on the
+suite of benchmarks.ybw, against the 26666 nodes of PVSCachedEngine, the
+extra nodes of the workers went from 16% to 20% with 2 workers, from 22% to
+26% with 4 and from 35% to 37% with 8 across runs (with quiescence=0 it was
+19% to 40%, 26% to 32% and 45% to 50%; 37% and 84% with 2 and 4 before the
+table was shared). The engine is not in the default arena configuration,
+benchmarks.ybw fails when the overhead goes over these figures (see its
+MAX_OVERHEAD).
+
+The processes are forked at every move, the engine is not pickled: this
+needs the fork start method of multiprocessing.
+"""
+import ctypes
+import multiprocessing
+import random
+from collections import defaultdict
+from Queue import Empty
+
+from game.cache import SharedCache
+from game.evaluate import INF
+from game.pv import PVTable
+from game.stats import new_profile
+
+# number of slots of the split nodes in the shared arrays, recycled: a
+# split node is known by its number (the count of the split nodes before
+# it), its slot is the number modulo SPLITS
+SPLITS = 1 << 16
+# a search looks for steal requests and cancellation every CHECK_NODES nodes
+CHECK_NODES = 64
+
+
+class Cancelled(Exception):
+    pass
+
+
+class YBWEngineMixin(object):
+    def __init__(self, *args, **kwargs):
+        self._workers = int(kwargs.pop('workers', multiprocessing.cpu_count()))
+        self._split_depth = int(kwargs.pop('split_depth', 5))
+        if self._workers > 1:
+            self._cache_class = SharedCache
+        super(YBWEngineMixin, self).__init__(*args, **kwargs)
+        self._jobs = None
+
+    def choose(self, game_problem, board):
+        if self._workers <= 1:
+            return super(YBWEngineMixin, self).choose(game_problem, board)
+
+        self._share(game_problem)
+        self._setup(0)
+
+        workers = [multiprocessing.Process(target=self._work, args=(i,))
+                   for i in range(1, self._workers)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        try:
+            return super(YBWEngineMixin, self).choose(game_problem, board)
+        finally:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
+            self._jobs = None
+
+    def _share(self, game_problem):
+        """Make the queues and the arrays the processes share for a move"""
+        self._game_problem = game_problem
+        # stolen jobs (or None if there was nothing to steal), steal
+        # requests and results, one queue of each per process
+        self._jobs = [multiprocessing.Queue() for i in range(self._workers)]
+        self._requests = [multiprocessing.Queue()
+                          for i in range(self._workers)]
+        self._results = [multiprocessing.Queue()
+                         for i in range(self._workers)]
+        self._cancelled = multiprocessing.RawArray(ctypes.c_int8, SPLITS)
+        self._alphas = multiprocessing.RawArray(ctypes.c_int64, SPLITS)
+        # the number of the split node using each slot, the jobs of an
+        # older node of the slot are cancelled
+        self._splits = multiprocessing.RawArray(ctypes.c_int64, SPLITS)
+        self._nsplits = multiprocessing.Value(ctypes.c_int64, 0)
+
+    def _setup(self, worker_id):
+        self._id = worker_id
+        # the split nodes the current search is under
+        self._ancestors = ()
+        # [split, jobs] of the split nodes of this process, innermost last
+        self._pending = []
+        # results received for the split nodes of this process
+        self._mailbox = defaultdict(list)
+        # the PV tables of the jobs, a job searched while waiting for a
+        # result must not overwrite the PVs of the nodes it is under
+        self._job_pvs = []
+        self._ticks = 0
+
+    def _work(self, worker_id):
+        self._setup(worker_id)
+        self.initcnt()
+        random.seed(worker_id)
+        victims = [i for i in range(self._workers) if i != worker_id]
+        asked = False
+        while True:
+            self._serve_requests()
+            if not asked:
+                self._requests[random.choice(victims)].put(worker_id)
+                asked = True
+            try:
+                job = self._jobs[worker_id].get(True, 0.001)
+            except Empty:
+                continue
+            asked = False
+            if job is not None:
+                result = self._run_job(job)
+                if result is not None:
+                    self._results[job[1]].put(result)
+
+    def _serve_requests(self):
+        """Give the oldest pending job to the processes asking for work"""
+        requests = self._requests[self._id]
+        while True:
+            try:
+                thief = requests.get_nowait()
+            except Empty:
+                return
+            job = None
+            for split, jobs in self._pending:
+                if jobs:
+                    job = jobs.pop(0)
+                    break
+            self._jobs[thief].put(job)
+
+    def _is_cancelled(self, ancestors):
+        cancelled = self._cancelled
+        splits = self._splits
+        for split in ancestors:
+            slot = split % SPLITS
+            if cancelled[slot] or splits[slot] != split:
+                return True
+        return False
+
+    def _run_job(self, job):
+        """Search the move of a job, return the result for its owner"""
+        split, owner, ancestors, board, m, depth, ply, alpha, beta = job
+        ancestors = ancestors + (split,)
+        if self._is_cancelled(ancestors):
+            return None
+        slot = split % SPLITS
+        alpha = max(alpha, self._alphas[slot])
+
+        saved = self._counters, self._profile, self._ancestors, self._pv
+        self._counters = defaultdict(int)
+        if self._profile is not None:
+            self._profile = new_profile()
+        self._ancestors = ancestors
+        self._pv = self._job_pvs.pop() if self._job_pvs else PVTable(
+            self._pv.plies)
+        game_problem = self._game_problem
+        try:
+            board.push(m)
+            if depth == 1 or (beta - alpha) == 1:
+                score = -self.search(game_problem, board, depth - 1, ply + 1,
+                                     -beta, -alpha)
+            else:
+                score = -self.search(game_problem, board, depth - 1, ply + 1,
+                                     -alpha - 1, -alpha)
+                if alpha < score < beta:
+                    score = -self.search(game_problem, board,
+                                         depth - 1, ply + 1, -beta, -alpha)
+            board.pop()
+            # the node is over and its slot taken by a newer one
+            if self._splits[slot] != split:
+                return None
+            # the owner may get the result later, the jobs of the node that
+            # start meanwhile use the new bound at once
+            if score >= beta:
+                self._cancelled[slot] = 1
+            elif score > self._alphas[slot]:
+                self._alphas[slot] = score
+            return (split, [m] + self._pv.line(ply + 1), score,
+                    self.snapshot())
+        except Cancelled:
+            return None
+        finally:
+            self._job_pvs.append(self._pv)
+            (self._counters, self._profile, self._ancestors,
+             self._pv) = saved
+
+    def _next_result(self, split):
+        """Wait for a result of split, searching its pending jobs meanwhile"""
+        jobs = self._pending[-1][1]
+        while True:
+            if self._mailbox[split]:
+                return self._mailbox[split].pop()
+            if self._is_cancelled(self._ancestors):
+                raise Cancelled()
+            self._serve_requests()
+            if jobs:
+                result = self._run_job(jobs.pop(0))
+                if result is not None:
+                    return result
+                continue
+            try:
+                result = self._results[self._id].get(True, 0.001)
+            except Empty:
+                continue
+            if result[0] == split:
+                return result
+            # a result of an enclosing split node of this process, the ones
+            # of finished nodes are dropped
+            if any(result[0] == s for s, _ in self._pending):
+                self._mailbox[result[0]].append(result)
+
+    def search(self, game_problem, board, depth, ply=1, alpha=-INF, beta=INF,
+               hint=None):
+        if self._jobs is None:
+            return super(YBWEngineMixin, self).search(
+                game_problem, board, depth, ply, alpha, beta, hint)
+
+        self._ticks += 1
+        if not self._ticks % CHECK_NODES:
+            if self._is_cancelled(self._ancestors):
+                raise Cancelled()
+            self._serve_requests()
+
+        if depth < self._split_depth:
+            return super(YBWEngineMixin, self).search(
+                game_problem, board, depth, ply, alpha, beta, hint)
+
+        if self._counting:
+            self.inc('nodes', ply)
+
+        end = game_problem.is_terminal(board)
+        if end is not None:
+            return self.endscore(end, ply)
+
+        decided, forced = self.tactics(board, depth, ply)
+        if decided is not None:
+            return decided
+
+        moves = forced or list(self.moveorder(board,
+                                              game_problem.actions(board),
+                                              hint))
+
+        # the eldest brother
+        board.push(moves[0])
+        score = -self.search(game_problem, board, depth - 1, ply + 1,
+                             -beta, -alpha)
+        board.pop()
+        if score > alpha:
+            self._pv.update(ply, moves[0])
+        bestscore = max(alpha, score)
+        if bestscore >= beta or len(moves) == 1:
+            if bestscore >= beta:
+                if self._counting:
+                    self.inc('betacuts', 0)
+                    self.inc('firstcuts')
+                self.cutoff(board, moves[0], depth)
+            return bestscore
+
+        # the younger brothers
+        with self._nsplits.get_lock():
+            split = self._nsplits.value
+            self._nsplits.value += 1
+        slot = split % SPLITS
+        self._cancelled[slot] = 0
+        self._alphas[slot] = bestscore
+        self._splits[slot] = split
+        self._pending.append([split, [
+            (split, self._id, self._ancestors, board.copy(), m, depth, ply,
+             bestscore, beta) for m in moves[1:]]])
+
+        try:
+            for i in range(len(moves) - 1):
+                _, pv, score, counts = self._next_result(split)
+                self.addcnt(counts)
+                if score > bestscore:
+                    bestscore = score
+                    self._pv.store(ply, pv)
+                if bestscore >= beta:
+                    if self._counting:
+                        self.inc('betacuts', moves.index(pv[0]))
+                    self.cutoff(board, pv[0], depth)
+                    self._cancelled[slot] = 1
+                    break
+        finally:
+            self._pending.pop()
+            self._mailbox.pop(split, None)
+
+        return bestscore
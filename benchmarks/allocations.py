@@ -0,0 +1,69 @@
+"""Count the board allocations done per node by a fixed depth search
+
+Usage: python -m benchmarks.allocations [DEPTH]
+
+Every Position built while searching (new boards and copies) is counted,
+which is where the per node allocations of the searches come from.
+"""
+import sys
+import time
+
+from problem.game_problem import Connect4
+from problem.position import Position
+from agents.negamax import NegamaxEngine
+from agents.alphabeta import AlphaBetaEngine
+from agents.pvs import PVSEngine
+from problem.utils import PLAYER1
+
+
+class AllocationCounter(object):
+    def __init__(self):
+        self.count = 0
+        self._init = Position.__init__
+        self._copy = Position.copy
+
+    def __enter__(self):
+        counter = self
+        init = self._init
+        copy = self._copy
+
+        def counted_init(pos, *args, **kwargs):
+            counter.count += 1
+            init(pos, *args, **kwargs)
+
+        def counted_copy(pos):
+            counter.count += 1
+            return copy(pos)
+
+        Position.__init__ = counted_init
+        Position.copy = counted_copy
+        return self
+
+    def __exit__(self, *exc):
+        Position.__init__ = self._init
+        Position.copy = self._copy
+
+
+def run(engine, depth):
+    game = Connect4()
+    board = game.new_board()
+    engine.initcnt()
+    with AllocationCounter() as allocations:
+        start = time.time()
+        engine.search(game, board, depth)
+        elapsed = time.time() - start
+    nodes = engine._counters['nodes']
+    print('%-12s nodes: %8d  boards: %8d  boards/node: %0.3f  nps: %d' % (
+        engine, nodes, allocations.count, allocations.count / float(nodes),
+        nodes / elapsed))
+
+
+def main(depth=8):
+    depth = int(depth)
+    run(NegamaxEngine(PLAYER1, depth - 3), depth - 3)
+    run(AlphaBetaEngine(PLAYER1, depth), depth)
+    run(PVSEngine(PLAYER1, depth), depth)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
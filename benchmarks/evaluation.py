@@ -0,0 +1,128 @@
+"""Compare the cost of the static evaluation modes
+
+Usage: python -m benchmarks.evaluation [DEPTH]
+
+Times Connect4.evaluate on a corpus of random positions, as board matrices
+(segment loop against lookup table) and as positions (bitboard against
+incremental counters), a big stack of boards with Connect4.evaluate_batch,
+then a fixed depth alpha-beta search with each evaluation mode of the
+engines.
+"""
+import random
+import sys
+import time
+
+import numpy as np
+
+from problem.game_problem import Connect4
+from problem.position import CountingPosition
+from agents.alphabeta import AlphaBetaEngine
+from problem.utils import PLAYER1, PLAYER2
+
+EVALUATIONS = ('bitboard', 'incremental')
+
+
+def random_positions(count, seed=0):
+    rnd = random.Random(seed)
+    game = Connect4()
+    positions = []
+    while len(positions) < count:
+        pos = game.new_board()
+        for i in range(rnd.randint(0, 30)):
+            pos.push(rnd.choice(game.actions(pos)))
+            if pos.end is not None:
+                pos.pop()
+                break
+        positions.append(pos)
+    return positions
+
+
+def loop_evaluate(player_id, board, weights=np.asarray([0, 0, 1, 4, 0])):
+    """The evaluation of board matrices looping over the segments"""
+    scores = {PLAYER1: np.zeros(5, dtype=int),
+              PLAYER2: np.zeros(5, dtype=int)}
+
+    segments = Connect4.segments(board)
+    filtered_segments = segments[segments.any(1)]
+
+    for s in filtered_segments:
+        c = np.bincount(s, minlength=3)
+
+        c1 = c[PLAYER1]
+        c2 = c[PLAYER2]
+
+        if c2 == 0:
+            scores[PLAYER1][c1] += 1
+        elif c1 == 0:
+            scores[PLAYER2][c2] += 1
+
+    score = (weights * scores[PLAYER1]).sum() - \
+        (weights * scores[PLAYER2]).sum()
+    if player_id == PLAYER1:
+        return score
+    else:
+        return -score
+
+
+def bench_arrays(positions, repeat=2):
+    boards = [p.to_array() for p in positions]
+    for name, evaluate in (('loop', loop_evaluate),
+                           ('table', Connect4.evaluate_array)):
+        start = time.time()
+        for i in range(repeat):
+            for board in boards:
+                evaluate(PLAYER1, board)
+        elapsed = time.time() - start
+        print('%-12s %8.2f us/board' % (
+            name, elapsed / (repeat * len(boards)) * 1e6))
+
+
+def bench_batch(positions, size=100000):
+    boards = np.array([p.to_array() for p in positions])
+    boards = boards[np.arange(size) % len(boards)]
+    start = time.time()
+    Connect4.evaluate_batch(PLAYER1, boards)
+    elapsed = time.time() - start
+    print('%-12s %8.2f us/board (%d boards in %0.2fs)' % (
+        'batch', elapsed / size * 1e6, size, elapsed))
+
+
+def bench_leaves(positions, repeat=5):
+    boards = {
+        'bitboard': positions,
+        'incremental': [CountingPosition.from_position(p) for p in positions],
+    }
+    for name in EVALUATIONS:
+        start = time.time()
+        for i in range(repeat):
+            for pos in boards[name]:
+                Connect4.evaluate(PLAYER1, pos)
+        elapsed = time.time() - start
+        print('%-12s %8.2f us/leaf' % (
+            name, elapsed / (repeat * len(positions)) * 1e6))
+
+
+def bench_search(depth):
+    game = Connect4()
+    for name in EVALUATIONS:
+        engine = AlphaBetaEngine(PLAYER1, depth, evaluation=name)
+        engine.initcnt()
+        board = engine.rootboard(game.new_board())
+        start = time.time()
+        engine.search(game, board, depth)
+        elapsed = time.time() - start
+        nodes = engine._counters['nodes']
+        print('%-12s AlphaBeta(%d) nodes: %d  time: %0.2fs  nps: %d' % (
+            name, depth, nodes, elapsed, nodes / elapsed))
+
+
+def main(depth=8):
+    positions = random_positions(2000)
+    bench_arrays(positions)
+    bench_batch(positions)
+    bench_leaves(positions)
+    bench_search(int(depth))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,55 @@
+"""Node rate of the Monte Carlo tree search
+
+Usage: python -m benchmarks.mcts [SIMULATIONS]
+
+The positions of the opening suite of benchmarks.smp are searched with
+SIMULATIONS simulations each (the tree is new for every position). The
+nodes are the moves played in the tree and in the rollouts.
+"""
+import random
+import sys
+import time
+
+import numpy as np
+
+from problem.game_problem import Connect4
+from agents.mcts import MonteCarloTreeSearch
+from problem.utils import PLAYER1
+from benchmarks.smp import suite
+
+
+def main(simulations=2000):
+    simulations = int(simulations)
+    game_problem = Connect4()
+    random.seed(0)
+    np.random.seed(0)
+    moves = [0]
+    elapsed = 0
+    for board in suite():
+        engine = MonteCarloTreeSearch(PLAYER1, simulations)
+        select = engine.select_next_move
+        rollout = engine.simulation_engine.choose
+
+        def counted_select(*args):
+            moves[0] += 1
+            return select(*args)
+
+        def counted_rollout(*args):
+            moves[0] += 1
+            return rollout(*args)
+        engine.select_next_move = counted_select
+        engine.simulation_engine.choose = counted_rollout
+
+        start = time.time()
+        engine.search(game_problem, board, simulations, engine.C)
+        elapsed += time.time() - start
+
+    count = simulations * len(list(suite()))
+    print('simulations: %d  nodes: %d  time: %0.2fs' % (count, moves[0],
+                                                         elapsed))
+    print('%d simulations/s, %d nodes/s' % (count / elapsed,
+                                            moves[0] / elapsed))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,38 @@
+"""Nodes and time to depth of MTD(f) against PVSDeep
+
+Usage: python -m benchmarks.mtdf [DEPTH [ORDERING]]
+
+Every position of the benchmarks.smp suite is searched to DEPTH by both
+engines, the nodes of all the depths are summed. The scores must be the
+same.
+"""
+import sys
+import time
+
+from problem.game_problem import Connect4
+from agents.pvs import PVSDeepEngine
+from agents.mtdf import MTDFEngine
+from problem.utils import PLAYER1
+from benchmarks.smp import suite
+
+
+def main(depth=9, ordering='history'):
+    game_problem = Connect4()
+    print('%-14s %10s %10s' % ('engine', 'nodes', 'time (s)'))
+    scores = {}
+    for engine_class in (PVSDeepEngine, MTDFEngine):
+        nodes = 0
+        start = time.time()
+        for i, board in enumerate(suite()):
+            engine = engine_class(PLAYER1, int(depth), ordering)
+            for _, _, score in engine.deepen(game_problem,
+                                             engine.rootboard(board),
+                                             verbose=False):
+                nodes += engine._counters['nodes']
+            assert scores.setdefault(i, score) == score
+        print('%-14s %10d %10.3f' % (engine_class.__name__, nodes,
+                                     time.time() - start))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,44 @@
+"""Nodes and beta cutoffs of the move orderings
+
+Usage: python -m benchmarks.ordering [DEPTH [ORDERING...]]
+
+Every position of the benchmarks.smp suite is searched to DEPTH by ABDeep
+and PVSDeep with every ordering, and the nodes, the time and the share of
+the beta cutoffs given by the first move searched are summed over the
+depths and the positions.
+"""
+import sys
+import time
+
+from problem.game_problem import Connect4
+from agents.alphabeta import ABDeepEngine
+from agents.pvs import PVSDeepEngine
+from problem.utils import PLAYER1
+from benchmarks.smp import suite
+
+ORDERINGS = ['seq', 'diff', 'eval', 'history']
+
+
+def main(depth=9, *orderings):
+    orderings = list(orderings) or ORDERINGS
+    game_problem = Connect4()
+    print('%-14s %-8s %10s %10s %10s' % ('engine', 'ordering', 'nodes',
+                                         'first cut', 'time (s)'))
+    for engine_class in (ABDeepEngine, PVSDeepEngine):
+        for ordering in orderings:
+            nodes = betacuts = firstcuts = 0
+            start = time.time()
+            for board in suite():
+                engine = engine_class(PLAYER1, int(depth), ordering)
+                for _ in engine.deepen(game_problem, engine.rootboard(board),
+                                       verbose=False):
+                    nodes += engine._counters['nodes']
+                    betacuts += engine._counters['betacuts']
+                    firstcuts += engine._counters['firstcuts']
+            print('%-14s %-8s %10d %9.1f%% %10.3f' % (
+                engine_class.__name__, ordering, nodes,
+                100.0 * firstcuts / betacuts, time.time() - start))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,47 @@
+"""Speedup of root splitting over the serial AlphaBeta and PVS searches
+
+Usage: python -m benchmarks.rootsplit [DEPTH [WORKERS...]]
+
+The positions of the opening suite of benchmarks.smp are searched to DEPTH
+by the serial engines and by the root split ones with every number of
+workers (2, 4 and 8 by default); the moves and scores must be the same.
+"""
+import sys
+import time
+
+from problem.game_problem import Connect4
+from agents.alphabeta import AlphaBetaEngine, ABSplitEngine
+from agents.pvs import PVSEngine, PVSSplitEngine
+from problem.utils import PLAYER1
+from benchmarks.smp import suite
+
+
+def run(engine):
+    """Search the suite, return the time and the (move, score) found"""
+    game_problem = Connect4()
+    found = []
+    engine.showstats = lambda pv, score: found.append((pv[0], score))
+    start = time.time()
+    for board in suite():
+        engine.choose(game_problem, board)
+    return time.time() - start, found
+
+
+def main(depth=7, *workers):
+    depth = int(depth)
+    workers = [int(x) for x in workers] or [2, 4, 8]
+    print('%-10s %8s %10s %8s' % ('engine', 'workers', 'time (s)', 'speedup'))
+    for serial_class, split_class in ((AlphaBetaEngine, ABSplitEngine),
+                                      (PVSEngine, PVSSplitEngine)):
+        serial, expected = run(serial_class(PLAYER1, depth))
+        print('%-10s %8d %10.3f %8.2f' % (serial_class.__name__[:-6], 1,
+                                          serial, 1))
+        for n in workers:
+            elapsed, found = run(split_class(PLAYER1, depth, workers=n))
+            assert found == expected, (found, expected)
+            print('%-10s %8d %10.3f %8.2f' % (split_class.__name__[:-6], n,
+                                              elapsed, serial / elapsed))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,47 @@
+"""Time to depth of the Lazy SMP PVSDeep engine
+
+Usage: python -m benchmarks.smp [DEPTH [THREADS...]]
+
+Every position of a small suite of openings is searched to DEPTH with every
+number of threads (1, 2, 4 and 8 by default), the table is new for every
+search.
+"""
+import sys
+import time
+
+from problem.game_problem import Connect4
+from agents.pvs import PVSDeepEngine
+from problem.utils import PLAYER1
+
+OPENINGS = [(), (3, 3), (3, 3, 2, 4), (2, 4, 3), (0, 6, 1, 5, 3)]
+
+
+def suite():
+    game_problem = Connect4()
+    for moves in OPENINGS:
+        board = game_problem.new_board()
+        for m in moves:
+            board.push(m)
+        yield board
+
+
+def main(depth=10, *threads):
+    threads = [int(x) for x in threads] or [1, 2, 4, 8]
+    game_problem = Connect4()
+    print('%-8s %10s %8s' % ('threads', 'time (s)', 'speedup'))
+    serial = None
+    for n in threads:
+        elapsed = 0
+        for board in suite():
+            engine = PVSDeepEngine(PLAYER1, int(depth), threads=n)
+            engine.showstats = lambda pv, score: None
+            start = time.time()
+            engine.choose(game_problem, board)
+            elapsed += time.time() - start
+        if serial is None:
+            serial = elapsed
+        print('%-8d %10.3f %8.2f' % (n, elapsed, serial / elapsed))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
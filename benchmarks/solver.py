@@ -0,0 +1,34 @@
+"""Time to solve positions with 12 or more chips
+
+Usage: python -m benchmarks.solver [MOVES...]
+
+MOVES are columns from 1 to 7, the positions below by default. Every
+position is solved with a new table.
+"""
+import sys
+import time
+
+from problem.game_problem import Connect4
+from agents.solver import Solver
+
+POSITIONS = ['527577332213', '166163511272', '566767147571',
+             '63772664447463', '77447642352727', '37544553247516']
+
+
+def main(*positions):
+    game_problem = Connect4()
+    print('%-16s %6s %10s %10s' % ('moves', 'score', 'nodes', 'time (s)'))
+    for moves in positions or POSITIONS:
+        board = game_problem.new_board()
+        for col in moves:
+            board.push(int(col) - 1)
+        solver = Solver(board.cols, board.rows)
+        start = time.time()
+        score = solver.solve(board.masks[board.to_move], board.masks[0],
+                             board.nmoves)
+        print('%-16s %6d %10d %10.3f' % (moves, score, solver.nodes,
+                                         time.time() - start))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
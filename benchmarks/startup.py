@@ -0,0 +1,72 @@
+"""Measure the startup time of every run.py command
+
+Usage: python -m benchmarks.startup [REPEAT]
+
+Every command is run REPEAT times in a fresh interpreter on a trivial
+workload (random engines), and the best wall time is reported together with
+the heavy modules that were imported. The game command is stopped before its
+main loop and uses the dummy SDL drivers, so that no display is needed.
+"""
+import os
+import sys
+import subprocess
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ('numpy', 'yaml', 'pygame')
+
+SCRIPT = """
+import sys
+sys.argv = %r
+sys.stdout = open(%r, 'w')
+import run
+if sys.argv[1] == 'game':
+    from game.game import GameEngine
+    GameEngine.run = lambda *args: None
+run.main()
+sys.stdout = sys.__stdout__
+print(' '.join(m for m in %r if m in sys.modules))
+"""
+
+
+def run_command(argv):
+    """Run run.py with argv in a new interpreter
+
+    Returns the wall time and the heavy modules it imported.
+    """
+    env = dict(os.environ, SDL_VIDEODRIVER='dummy', SDL_AUDIODRIVER='dummy')
+    script = SCRIPT % (['run.py'] + argv, os.devnull, MODULES)
+    start = time.time()
+    out = subprocess.check_output([sys.executable, '-c', script],
+                                  cwd=ROOT, env=env)
+    elapsed = time.time() - start
+    return elapsed, out.decode().strip().splitlines()[-1].split()
+
+
+def main(repeat=5):
+    config = tempfile.NamedTemporaryFile(suffix='.yaml', delete=False)
+    config.write(b'- class: random\n- class: random\n  name: random2\n')
+    config.close()
+
+    commands = [
+        ('bm', ['bm', 'random']),
+        ('arena', ['arena', config.name]),
+        ('game', ['game', 'random']),
+        ]
+    try:
+        print('%-8s %10s  %s' % ('command', 'best (ms)', 'imported'))
+        for name, argv in commands:
+            times = []
+            for i in range(int(repeat)):
+                elapsed, modules = run_command(argv)
+                times.append(elapsed)
+            print('%-8s %10.1f  %s' % (name, min(times) * 1000,
+                                       ', '.join(modules)))
+    finally:
+        os.unlink(config.name)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,61 @@
+"""Node overhead and speedup of the Young Brothers Wait PVS
+
+Usage: python -m benchmarks.ybw [DEPTH [WORKERS...]]
+
+The positions of the opening suite of benchmarks.smp are searched to DEPTH
+by PVSCachedEngine and by PVSYBWEngine (cached too, its workers share the
+table) with every number of workers (2, 4 and 8 by default). The nodes of
+all the processes are added up, the overhead is the number of extra nodes
+over the serial search. The benchmark fails when it is over the
+MAX_OVERHEAD of the number of workers.
+"""
+import sys
+import time
+
+from problem.game_problem import Connect4
+from agents.pvs import PVSCachedEngine, PVSYBWEngine
+from problem.utils import PLAYER1
+from benchmarks.smp import suite
+
+# workers -> percent, the worst overheads measured at depth 8 (20%, 26% and
+# 37%, see agents.ybw) with some room for the variations between runs
+MAX_OVERHEAD = {2: 25, 4: 30, 8: 45}
+
+
+def run(engine):
+    """Search the suite, return the time, the nodes and the scores"""
+    game_problem = Connect4()
+    scores = []
+    nodes = [0]
+
+    def showstats(pv, score):
+        scores.append(score)
+        nodes[0] += engine._counters['nodes']
+    engine.showstats = showstats
+
+    start = time.time()
+    for board in suite():
+        engine.choose(game_problem, board)
+    return time.time() - start, nodes[0], scores
+
+
+def main(depth=8, *workers):
+    depth = int(depth)
+    workers = [int(x) for x in workers] or [2, 4, 8]
+    print('%-8s %10s %10s %9s %8s' % ('workers', 'time (s)', 'nodes',
+                                      'overhead', 'speedup'))
+    serial, serial_nodes, expected = run(PVSCachedEngine(PLAYER1, depth,
+                                                         'eval'))
+    print('%-8d %10.3f %10d %8.1f%% %8.2f' % (1, serial, serial_nodes, 0, 1))
+    for n in workers:
+        elapsed, nodes, scores = run(PVSYBWEngine(PLAYER1, depth, 'eval',
+                                                  workers=n))
+        assert scores == expected, (scores, expected)
+        overhead = 100.0 * nodes / serial_nodes - 100
+        print('%-8d %10.3f %10d %8.1f%% %8.2f' % (
+            n, elapsed, nodes, overhead, serial / elapsed))
+        assert overhead <= MAX_OVERHEAD.get(n, 100), (n, overhead)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
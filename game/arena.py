@@ -1,6 +1,7 @@
 from itertools import permutations
 
-from game import GameEngine
+from problem.game_problem import Connect4
+from problem.utils import PLAYER1, PLAYER2, DRAW
 
 
 class Stat(object):
@@ -15,6 +16,29 @@ class Stat(object):
         self.score = 0
 
 
+def play(game_problem, e1, e2):
+    """Play a game without display, e1 moves first
+
+    Returns the final board, the winner and the looser engines (None, None
+    for a draw).
+    """
+    players = {PLAYER1: e1, PLAYER2: e2}
+    e1.playing_as = PLAYER1
+    e2.playing_as = PLAYER2
+
+    board = game_problem.new_board()
+    end = None
+    while end is None:
+        player = board.to_move
+        move = players[player].choose(game_problem, board)
+        board = game_problem.make_action(player, move, board)
+        end = game_problem.is_terminal(board)
+
+    if end == DRAW:
+        return board, None, None
+    return board, players[end], players[PLAYER1 + PLAYER2 - end]
+
+
 def arena(engines, rounds):
     DRAW_SCORE = 1
     WIN_SCORE = 3
@@ -26,8 +50,7 @@ def arena(engines, rounds):
     for round in range(rounds):
         for (n1, e1), (n2, e2) in permutations(engines, 2):
             print("%s vs %s" % (n1, n2))
-            game = GameEngine(e1, e2)
-            b, winner, looser = game.play()
+            b, winner, looser = play(Connect4(), e1, e2)
 
             if winner is None:
                 stats[n1].draws += 1
@@ -0,0 +1,185 @@
+"""Opening book: the moves and scores of the early positions, in a file
+
+The book file has a header, then the keys of the positions in increasing
+order (uint64), their scores (int16) and their best moves (int8). A key is
+the symmetric Zobrist key of the position (Position.hashkey), the move is
+the one of the position with that key: the mirrored position plays the
+mirrored move. The score is from the side to move.
+
+A Book maps the file with numpy.memmap and looks for a key with a binary
+search over the keys, the file is never read as a whole.
+
+build writes a book from the analysis of every position with up to plies
+chips by an engine (one that has solve or deepen), with a pool of
+processes. The analysed positions are appended to a checkpoint file as
+they are done, so that an interrupted build resumes where it stopped.
+"""
+import multiprocessing
+import os
+
+import numpy as np
+
+MAGIC = 'C4BK'
+VERSION = 1
+HEADER = np.dtype([('magic', 'S4'), ('version', '<u4'), ('cols', '<u4'),
+                   ('rows', '<u4'), ('count', '<u8')])
+# a checkpoint is a sequence of records, in the order they were analysed
+RECORD = np.dtype([('key', '<u8'), ('score', '<i2'), ('move', 'i1')])
+
+
+class Book(object):
+    def __init__(self, path):
+        header = np.fromfile(path, dtype=HEADER, count=1)
+        if len(header) != 1 or header['magic'][0] != MAGIC:
+            raise ValueError('%s is not a book' % path)
+        if header['version'][0] != VERSION:
+            raise ValueError('%s: unknown book version %d' % (
+                path, header['version'][0]))
+        self.cols = int(header['cols'][0])
+        self.rows = int(header['rows'][0])
+        count = int(header['count'][0])
+        offset = HEADER.itemsize
+        self._keys = np.memmap(path, dtype='<u8', mode='r', offset=offset,
+                               shape=(count,))
+        offset += 8 * count
+        self._scores = np.memmap(path, dtype='<i2', mode='r', offset=offset,
+                                 shape=(count,))
+        offset += 2 * count
+        self._moves = np.memmap(path, dtype='i1', mode='r', offset=offset,
+                                shape=(count,))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def probe(self, board):
+        """Return the best move and the score of board, None if it is not in
+        the book"""
+        if (board.cols, board.rows) != (self.cols, self.rows):
+            return None
+        key, flip = board.hashkey()
+        key = np.uint64(key)
+        i = self._keys.searchsorted(key)
+        if i == len(self._keys) or self._keys[i] != key:
+            return None
+        move = int(self._moves[i])
+        if flip:
+            move = self.cols - 1 - move
+        return move, int(self._scores[i])
+
+
+def write(path, records, cols, rows):
+    """Write a book of records (a RECORD array, in any order)"""
+    records = np.sort(records, order='key')
+    header = np.zeros(1, dtype=HEADER)
+    header['magic'] = MAGIC
+    header['version'] = VERSION
+    header['cols'] = cols
+    header['rows'] = rows
+    header['count'] = len(records)
+    with open(path, 'wb') as f:
+        header.tofile(f)
+        np.ascontiguousarray(records['key']).tofile(f)
+        np.ascontiguousarray(records['score']).tofile(f)
+        np.ascontiguousarray(records['move']).tofile(f)
+
+
+def positions(game_problem, plies):
+    """Return the positions with up to plies chips that are not over, one
+    of every pair of mirrored positions"""
+    level = [game_problem.new_board()]
+    found = list(level)
+    for ply in range(plies):
+        children = {}
+        for board in level:
+            for m in game_problem.actions(board):
+                child = board.copy()
+                child.push(m)
+                if child.end is None:
+                    children.setdefault(child.hashkey()[0], child)
+        level = children.values()
+        found.extend(level)
+    return found
+
+
+def read_checkpoint(path):
+    """Return the records of a checkpoint, a partly written last record is
+    dropped"""
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=RECORD)
+    with open(path, 'rb') as f:
+        data = f.read()
+    count = len(data) // RECORD.itemsize
+    return np.frombuffer(data[:count * RECORD.itemsize], dtype=RECORD)
+
+
+# set in every worker by _init_worker
+_worker = {}
+
+
+def _init_worker(engine_class, args, kwargs):
+    from problem.utils import PLAYER1
+    _worker['engine'] = engine_class(PLAYER1, *args, **kwargs)
+
+
+def _analyse(board):
+    from problem.game_problem import Connect4
+    engine = _worker['engine']
+    if hasattr(engine, 'solve'):
+        move, score = engine.solve(board)
+    else:
+        for depth, pv, score in engine.deepen(Connect4(),
+                                              engine.rootboard(board),
+                                              verbose=False):
+            pass
+        move = pv[0]
+    key, flip = board.hashkey()
+    if flip:
+        move = board.cols - 1 - move
+    return key, score, move
+
+
+def build(path, game_problem, engine_class, args=(), kwargs=None, plies=8,
+          workers=1, checkpoint=None, verbose=True):
+    """Analyse the positions with up to plies chips and write their book
+
+    engine_class(PLAYER1, *args, **kwargs) is built in every worker. The
+    checkpoint (path + '.ckpt' by default) is removed once the book is
+    written.
+    """
+    kwargs = kwargs or {}
+    checkpoint = checkpoint or path + '.ckpt'
+    done = read_checkpoint(checkpoint)
+    # a partly written last record is overwritten
+    with open(checkpoint, 'ab') as f:
+        f.truncate(len(done) * RECORD.itemsize)
+    done_keys = set(done['key'].tolist())
+    todo = [board for board in positions(game_problem, plies)
+            if board.hashkey()[0] not in done_keys]
+    if verbose:
+        print('%d positions, %d already analysed' % (
+            len(todo) + len(done_keys), len(done_keys)))
+
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, _init_worker,
+                                    (engine_class, args, kwargs))
+        results = pool.imap_unordered(_analyse, todo, chunksize=4)
+    else:
+        pool = None
+        _init_worker(engine_class, args, kwargs)
+        results = (_analyse(board) for board in todo)
+
+    try:
+        with open(checkpoint, 'ab') as f:
+            for i, result in enumerate(results):
+                np.array([result], dtype=RECORD).tofile(f)
+                f.flush()
+                if verbose and (i + 1) % 100 == 0:
+                    print('%d/%d' % (i + 1, len(todo)))
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    board = game_problem.new_board()
+    write(path, read_checkpoint(checkpoint), board.cols, board.rows)
+    os.remove(checkpoint)
@@ -1,30 +1,84 @@
-from collections import namedtuple, OrderedDict
+"""Transposition table
+
+The table is made of two preallocated NumPy arrays, one for the keys and one
+for the entries, indexed by the hashkey of the position modulo the number of
+buckets. A bucket has two slots: the first one keeps the deepest entry (of
+the current search), the second one is always replaced.
+
+An entry is packed in a 64 bits integer:
+
+    bits  0-1   bound (EXACT, UPPERBOUND, LOWERBOUND), 0 for an empty slot
+    bits  2-7   move + 1 (0 for no move)
+    bits  8-15  depth + 1
+    bits 16-23  generation
+    bits 24-47  score + SCORE_OFFSET
+
+The generation is increased by new_search, entries of older searches are
+replaced first.
+
+The key array holds the hashkey XOR the entry, a slot is only used if both
+agree: an entry half written by another process sharing the table (see
+SharedCache) is then seen as a miss, so no lock is needed.
+"""
+import ctypes
+import multiprocessing
+
+import numpy as np
+
 from problem.game_problem import Connect4
 from evaluate import INF
 
 
-Entry = namedtuple('Entry', 'move depth score state')
+class Cache(object):
+    EXACT = 1
+    UPPERBOUND = 2
+    LOWERBOUND = 3
 
+    DEFAULT_MB = 16
+    # bytes of a slot: a key and an entry
+    SLOT_SIZE = 16
+    SCORE_OFFSET = 1 << 23
 
-class Cache(object):
-    EXACT = object()
-    UPPERBOUND = object()
-    LOWERBOUND = object()
+    def __init__(self, size_mb=DEFAULT_MB):
+        self._buckets = max(1, int(size_mb * (1 << 20)) // (2 * Cache.SLOT_SIZE))
+        self._keys, self._entries = self._allocate(2 * self._buckets)
+        self.generation = 0
+
+    def _allocate(self, size):
+        return (np.zeros(size, dtype=np.int64),
+                np.zeros(size, dtype=np.int64))
+
+    @property
+    def size_mb(self):
+        return 2 * self._buckets * Cache.SLOT_SIZE / float(1 << 20)
 
-    def __init__(self, maxitems=50000):
-        self._maxitems = maxitems
-        self._cache = OrderedDict()
+    def new_search(self):
+        """Age the entries stored so far"""
+        self.generation = (self.generation + 1) & 0xff
 
-    def put(self, board, moves, depth, ply, score, alpha=-INF, beta=INF):
+    def clear(self):
+        self._keys[:] = 0
+        self._entries[:] = 0
+        self.generation = 0
+
+    @staticmethod
+    def _key(board):
         key, flip = Connect4.hashkey(board)
-        if moves:
-            move = moves[0]
-        else:
-            move = None
+        # stored as a signed 64 bits integer
+        if key >= 1 << 63:
+            key -= 1 << 64
+        return key, flip
+
+    def put(self, board, move, depth, ply, score, alpha=-INF, beta=INF):
+        """Keep the result of the search of board at depth, nothing is kept
+        for a negative depth"""
+        if depth < 0:
+            return
+        key, flip = self._key(board)
         if flip and move is not None:
-            move = 6 - move
+            move = board.cols - 1 - move
 
-        if depth == 0 or depth == -1 or alpha < score < beta:
+        if depth == 0 or alpha < score < beta:
             state = Cache.EXACT
         elif score >= beta:
             state = Cache.LOWERBOUND
@@ -35,39 +89,99 @@ class Cache(object):
         else:
             assert False
 
-        entry = Entry(move, depth, int(score), state)
-        self._cache.pop(key, None)
-        self._cache[key] = entry
+        entry = (state |
+                 (0 if move is None else move + 1) << 2 |
+                 (depth + 1) << 8 |
+                 self.generation << 16 |
+                 (int(score) + Cache.SCORE_OFFSET) << 24)
+
+        # the deepest slot is replaced by deeper entries, entries of the same
+        # position and entries of older searches
+        slot = (key % self._buckets) << 1
+        old = self._entries.item(slot)
+        if (not old or self._keys.item(slot) ^ old == key or
+                depth + 1 >= (old >> 8) & 0xff or
+                (old >> 16) & 0xff != self.generation):
+            self._keys[slot] = key ^ entry
+            self._entries[slot] = entry
+        else:
+            self._keys[slot + 1] = key ^ entry
+            self._entries[slot + 1] = entry
+
+    def _entry(self, board):
+        """Return the entry of board (0 if there is none) and whether the
+        board was flipped for the key"""
+        key, flip = self._key(board)
+        slot = (key % self._buckets) << 1
+        entry = self._entries.item(slot)
+        if not entry or self._keys.item(slot) ^ entry != key:
+            slot += 1
+            entry = self._entries.item(slot)
+            if not entry or self._keys.item(slot) ^ entry != key:
+                return 0, flip
+        return entry, flip
 
-        if len(self._cache) > self._maxitems:
-            self._cache.popitem(last=False)
+    def move(self, board, depth):
+        """Return the best move of an EXACT entry of board searched at depth
+        or deeper, None otherwise: the moves of the bounds are only the
+        ones that cut or came first"""
+        entry, flip = self._entry(board)
+        if (entry & 0x3 != Cache.EXACT or
+                ((entry >> 8) & 0xff) - 1 < depth or
+                not (entry >> 2) & 0x3f):
+            return None
+        move = ((entry >> 2) & 0x3f) - 1
+        if flip:
+            move = board.cols - 1 - move
+        return move
 
     def lookup(self, board, depth, ply, alpha=-INF, beta=INF):
-        key, flip = Connect4.hashkey(board)
-        if key not in self._cache:
+        entry, flip = self._entry(board)
+        if not entry:
             return False, None, None
 
-        entry = self._cache[key]
+        state = entry & 0x3
+        move = ((entry >> 2) & 0x3f) - 1
+        entry_depth = ((entry >> 8) & 0xff) - 1
+        score = (entry >> 24) - Cache.SCORE_OFFSET
 
         hit = False
-        if entry.depth == -1:
-            hit = True
-        elif entry.depth >= depth:
-            if entry.state is Cache.EXACT:
+        if entry_depth >= depth:
+            if state == Cache.EXACT:
                 hit = True
-            elif entry.state is Cache.LOWERBOUND and entry.score >= beta:
+            elif state == Cache.LOWERBOUND and score >= beta:
                 hit = True
-            elif entry.state is Cache.UPPERBOUND and entry.score <= alpha:
+            elif state == Cache.UPPERBOUND and score <= alpha:
                 hit = True
 
-        if flip and entry.move is not None:
-            move = 6 - entry.move
-        else:
-            move = entry.move
+        if move == -1:
+            move = None
+        elif flip:
+            move = board.cols - 1 - move
 
-        if hit:
-            score = entry.score
-        else:
+        if not hit:
             score = None
 
         return hit, move, score
+
+
+class SharedCache(Cache):
+    """A Cache whose arrays are in shared memory
+
+    The processes forked after the creation of the table read and write the
+    same entries. The generation is shared too: a new_search of one process
+    is seen by the processes forked before it.
+    """
+    def _allocate(self, size):
+        self._shared = (multiprocessing.RawArray(ctypes.c_int64, size),
+                        multiprocessing.RawArray(ctypes.c_int64, size))
+        self._generation = multiprocessing.RawValue(ctypes.c_int64, 0)
+        return tuple(np.frombuffer(x, dtype=np.int64) for x in self._shared)
+
+    @property
+    def generation(self):
+        return self._generation.value
+
+    @generation.setter
+    def generation(self, value):
+        self._generation.value = value
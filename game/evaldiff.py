@@ -1,11 +1,11 @@
 import numpy as np
 from problem.utils import PLAYER2, PLAYER1
 from evaluate import INF
-from tables import evaldiff_lookup, evaldiff_threat_lookup
 from problem.game_problem import Connect4
+from problem.tables import SEGMENT_BASE, code_tables
 
 
-def evaldiff(board, m, play_as, weights=np.array([1, 3, 9, 27], dtype=int)):
+def evaldiff(board, m, play_as, weights=SEGMENT_BASE):
 
     def get_free_row(move):
         r = board[move].argmin()
@@ -18,12 +18,57 @@ def evaldiff(board, m, play_as, weights=np.array([1, 3, 9, 27], dtype=int)):
     stm = next_to_play
     indices = np.dot(Connect4.segments_around(board, r, m),
                      weights)
-    partial_scores = evaldiff_lookup[stm][indices]
+    lookup = code_tables()
+    partial_scores = lookup.evaldiff_lookup[stm][indices]
 
     if (partial_scores == 4**2).any():
         return INF
 
-    if evaldiff_threat_lookup[stm][indices].any():
+    if lookup.evaldiff_threat_lookup[stm][indices].any():
         return INF - 1
 
     return partial_scores.sum()
+
+
+def evaldiff_moves(pos, moves):
+    """Return the evaldiff scores of moves in the Position pos
+
+    The same scores as evaldiff on the board matrix, read from the bitboards
+    without building the matrix: INF for the squares that block a four of
+    the opponent, INF - 1 for the ones that make four, otherwise the sum on
+    the segments through the square of 1 when empty, c**2 with c chips of
+    the side to move only, (c + 1)**2 with c chips of the opponent only.
+    """
+    geo = pos.geometry
+    height = geo.height
+    heights = pos.heights
+    me = pos.to_move
+    other = PLAYER1 if me != PLAYER1 else PLAYER2
+    mine = pos.masks[me]
+    theirs = pos.masks[other]
+    blocks = pos.winning_squares(other)
+    wins = pos.winning_squares(me)
+    cell_segments = geo.cell_segments
+
+    scores = []
+    for m in moves:
+        idx = m * height + heights[m]
+        bit = 1 << idx
+        if blocks & bit:
+            scores.append(INF)
+            continue
+        if wins & bit:
+            scores.append(INF - 1)
+            continue
+        score = 0
+        for seg in cell_segments[idx]:
+            t = theirs & seg
+            if mine & seg:
+                if not t:
+                    score += bin(mine & seg).count('1') ** 2
+            elif t:
+                score += (bin(t).count('1') + 1) ** 2
+            else:
+                score += 1
+        scores.append(score)
+    return scores
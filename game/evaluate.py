@@ -9,38 +9,36 @@ INF = 1000
 class Evaluator(object):
     def __init__(self, weights=[0, 0, 1, 4, 0]):
         self._weights = np.asarray(weights)
+        self._table = Connect4.weights_table(self._weights)
 
     def evaluate(self, board):
-        scores = {PLAYER1: np.zeros(5, dtype=int),
-                  PLAYER2: np.zeros(5, dtype=int)}
+        """Evaluate board from the point of view of the side to move
+
+        board is either a Position or a board matrix. A matrix is scored
+        from its segment codes with a single lookup in the weights table.
+        """
+        if isinstance(board, np.ndarray):
+            codes = Connect4.segment_codes(board)
+            end = Connect4.codes_winner(codes, board)
+            to_move = PLAYER2 if np.count_nonzero(board) & 1 else PLAYER1
+        else:
+            codes = None
+            end = Connect4.is_terminal(board)
+            to_move = board.to_move
 
-        if board.end is not None:
-            if board.end == DRAW:
+        if end is not None:
+            if end == DRAW:
                 return 0
-            elif board.end == board.get_next_to_move:
+            elif end == to_move:
                 return INF
             else:
                 return -INF
 
-        segments = Connect4.segments(board)
-        filtered_segments = segments[segments.any(1)]
-
-        for s in filtered_segments:
-            c = np.bincount(s, minlength=3)
-
-            c1 = c[PLAYER1]
-            c2 = c[PLAYER2]
-
-            if c2 == 0:
-                scores[PLAYER1][c1] += 1
-            elif c1 == 0:
-                scores[PLAYER2][c2] += 1
-
-        s1 = (self._weights * scores[PLAYER1]).sum()
-        s2 = (self._weights * scores[PLAYER2]).sum()
+        if codes is None:
+            return Connect4.evaluate(to_move, board, self._weights)
 
-        score = s1 - s2
-        if board.get_next_to_move == PLAYER1:
+        score = self._table[codes].sum()
+        if to_move == PLAYER1:
             return score
         else:
             return -score
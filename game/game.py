@@ -18,7 +18,7 @@ class GameEngine(object):
         Attributes:
         running (bool): True while the engine is online. Changed via QuitEvent().
         _whose_turn (int): Keeps whose turn it is. Using constant values PLAYER1, PLAYER2.
-        _board (int matrix): game board.
+        _board (Position): game board.
         has_ended (bool): a flag to mark whether the current match has ended
         """
         self.evManager = evManager
@@ -60,13 +60,14 @@ class GameEngine(object):
 
     def new_game(self):
         self._whose_turn = PLAYER1
-        # board represented as a matrix
-        self._board = np.zeros(self.game_problem.get_board_dim, dtype=int)
+        # board represented as a bitboard Position
+        self._board = self.game_problem.new_board()
         self.has_ended = False
 
     @property
     def get_board(self):
-        return self._board
+        """The board as a matrix (board[col][row]), as used by the view"""
+        return self._board.to_array()
     
     @property
     def whose_turn(self):
@@ -1,7 +1,8 @@
 import random
-from functools import partial
-from evaluate import Evaluator
-from evaldiff import evaldiff
+from collections import defaultdict
+from evaldiff import evaldiff_moves
+from problem.game_problem import Connect4
+from problem.utils import PLAYER1, PLAYER2
 
 
 class MoveOrder(object):
@@ -14,8 +15,16 @@ class MoveOrder(object):
             self._order = self._order_eval
         elif name == 'diff':
             self._order = self._order_diff
+        elif name == 'history':
+            self._order = self._order_history
+            self.cutoff = self._cutoff_history
         else:
             raise NotImplemented()
+        # the two killer moves of every ply (number of moves of the board)
+        # and the history scores of every (player, column, height) move,
+        # learnt from the beta cutoffs by the 'history' ordering
+        self._killers = defaultdict(lambda: [None, None])
+        self._history = defaultdict(int)
 
     def _order_seq(self, board, moves):
         return moves
@@ -25,22 +34,54 @@ class MoveOrder(object):
         return moves
 
     def _order_eval(self, board, moves):
-        if not hasattr(self, 'evaluate'):
-            self.evaluate = Evaluator().evaluate
-
         if len(moves) <= 1:
             return moves
 
-        return sorted(moves,
-                      key=lambda m: -self.evaluate(board.actions(m)),
-                      reverse=True)
+        # the children are evaluated from the side of the opponent
+        children = board.children_array(moves)
+        scores = Connect4.evaluate_batch(
+            PLAYER1 if board.to_move != PLAYER1 else PLAYER2, children)
+        return [moves[i] for i in scores.argsort(kind='mergesort')]
 
     def _order_diff(self, board, moves):
         if len(moves) <= 1:
             return moves
 
-        return sorted(moves, key=partial(evaldiff, board),
-                      reverse=True)
+        scores = evaldiff_moves(board, moves)
+        return [moves[i] for i in sorted(range(len(moves)),
+                                         key=scores.__getitem__,
+                                         reverse=True)]
+
+    def _order_history(self, board, moves):
+        if len(moves) <= 1:
+            return moves
+
+        history = self._history
+        player = board.to_move
+        heights = board.heights
+        # the ties are broken by the distance to the center column
+        center = board.cols - 1
+        killers = [m for m in self._killers[board.nmoves] if m in moves]
+        others = sorted((m for m in moves if m not in killers),
+                        key=lambda m: (history[player, m, heights[m]] *
+                                       (center + 1) - abs(2 * m - center)),
+                        reverse=True)
+        return killers + others
+
+    def _cutoff_history(self, board, move, depth):
+        killers = self._killers[board.nmoves]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self._history[board.to_move, move, board.heights[move]] += \
+            depth * depth
+
+    def cutoff(self, board, move, depth):
+        """Tell the ordering that move gave a beta cutoff at depth on board
+
+        board is the position before move, only 'history' learns from it.
+        """
+        pass
 
     def order(self, board, moves, hint=None):
         if hint is not None:
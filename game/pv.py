@@ -0,0 +1,62 @@
+"""Triangular principal variation table
+
+Row ply holds the PV of the node searched at ply, from its move on: the
+moves are in row[ply:length[ply]]. A node clears its row when it has no
+move to play (a leaf, the end of the game), and when one of its moves
+becomes the best one it copies the row of the child after that move. The
+rows are allocated once, a search only assigns list slots.
+"""
+
+
+class PVTable(object):
+    # plies of a 7x6 board, with the root at ply 1
+    DEFAULT_PLIES = 44
+
+    def __init__(self, plies=DEFAULT_PLIES):
+        self.plies = 0
+        self._rows = []
+        self._length = []
+        self.reserve(plies)
+
+    def reserve(self, plies):
+        """Make room for nodes up to ply plies - 1"""
+        if plies <= self.plies:
+            return
+        self.plies = plies
+        self._rows = [[0] * plies for ply in range(plies + 1)]
+        self._length = [0] * (plies + 1)
+
+    def clear(self, ply):
+        self._length[ply] = ply
+
+    def update(self, ply, move):
+        """Make move then the PV of ply + 1 the PV of ply"""
+        rows = self._rows
+        row = rows[ply]
+        row[ply] = move
+        i = ply + 1
+        length = self._length[i]
+        if length > i:
+            # no slice nor xrange, nothing is allocated
+            child = rows[i]
+            while i < length:
+                row[i] = child[i]
+                i += 1
+        self._length[ply] = i
+
+    def store(self, ply, moves):
+        """Make the list moves the PV of ply"""
+        row = self._rows[ply]
+        for i, m in enumerate(moves):
+            row[ply + i] = m
+        self._length[ply] = ply + len(moves)
+
+    def first(self, ply):
+        """Return the first move of the PV of ply, None if it is empty"""
+        if self._length[ply] > ply:
+            return self._rows[ply][ply]
+        return None
+
+    def line(self, ply=1):
+        """Return a copy of the PV of ply"""
+        return self._rows[ply][ply:self._length[ply]]
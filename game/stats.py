@@ -0,0 +1,57 @@
+"""Search statistics
+
+What the searches of an engine count depends on its stats setting:
+
+    counters    the totals of the counters (nodes, leaves, betacuts...),
+                shown after every search (the default)
+    production  nothing is counted, the searches skip the counter updates;
+                only the score, the time and the PV are shown
+    profile     the totals, and the counts of some counters by index: the
+                nodes by ply, the beta cutoffs by the number of the move
+                that cut (0 for the first one), the cache probes and hits
+                by depth
+
+report makes a profile a dict ready for JSON, with the effective branching
+factor and the cache hit rates.
+"""
+from collections import defaultdict
+
+MODES = ('counters', 'production', 'profile')
+
+
+def new_profile():
+    """Return an empty profile: the counts by name, then by index"""
+    return defaultdict(lambda: defaultdict(int))
+
+
+def _by_index(counts, first):
+    """Return the counts of the indexes from first to the last one counted
+    as a list"""
+    if not counts:
+        return []
+    return [counts.get(i, 0) for i in range(first, max(counts) + 1)]
+
+
+def report(counters, profile, depth, time):
+    """Return the counters and the profile of a search at depth as a dict"""
+    nodes_by_ply = _by_index(profile['nodes'], 1)
+    branching = [float(n) / p if p else None
+                 for p, n in zip(nodes_by_ply, nodes_by_ply[1:])]
+    hits = profile['hits']
+    hit_rate = [float(hits.get(d, 0)) / n if n else None
+                for d, n in enumerate(_by_index(profile['probes'], 0))]
+    nodes = counters.get('nodes', 0)
+    return {
+        'depth': depth,
+        'time': time,
+        'counters': dict(counters),
+        # the number of moves a node would have in a uniform tree of the
+        # same size and depth
+        'ebf': nodes ** (1.0 / depth) if depth and nodes else None,
+        # from ply 1, the root
+        'nodes_by_ply': nodes_by_ply,
+        'branching_by_ply': branching,
+        'cutoffs_by_move': _by_index(profile['betacuts'], 0),
+        # from depth 0, the leaves
+        'hit_rate_by_depth': hit_rate,
+        }
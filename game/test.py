@@ -1,13 +1,39 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
 import unittest
 
 import numpy as np
 
-from c4.board import Board, PLAYER1
+from problem.game_problem import Connect4
+from problem.position import Position, CountingPosition
+from problem.utils import PLAYER1, PLAYER2, DRAW
+from evaluate import Evaluator, INF
+from cache import Cache, SharedCache
+from moveorder import MoveOrder
+from evaldiff import evaldiff, evaldiff_moves
+from pv import PVTable
+import book
+from arena import play
+import run
+from agents.alphabeta import AlphaBetaEngine, ABSplitEngine, ABDeepEngine
+from agents.mcts import MonteCarloTreeSearch
+from agents.pvs import (PVSEngine, PVSCachedEngine, PVSSplitEngine,
+                        PVSYBWEngine, PVSDeepEngine)
+from agents.mtdf import MTDFEngine
+from agents.ybw import SPLITS
+from agents.solver import SolverEngine
+from agents.greedy import WeightedGreedyEngine
+from agents.rand import RandomEngine
 
 
 class TestBoard(unittest.TestCase):
     def test_end_diag_lr(self):
-        b = Board(np.array([[1, 0, 0, 0, 0, 0, 0],
+        b = Position.from_array(np.array([[1, 0, 0, 0, 0, 0, 0],
                             [2, 1, 0, 0, 0, 0, 0],
                             [2, 2, 1, 0, 0, 0, 0],
                             [1, 1, 2, 1, 0, 0, 0],
@@ -17,7 +43,7 @@ class TestBoard(unittest.TestCase):
                             [0, 0, 0, 0, 0, 0, 0]]))
         self.assertTrue(b.end == PLAYER1)
 
-        b = Board(np.array([[1, 2, 1, 2, 1, 2, 1],
+        b = Position.from_array(np.array([[1, 2, 1, 2, 1, 2, 1],
                             [1, 2, 1, 2, 1, 1, 0],
                             [1, 2, 1, 2, 1, 0, 0],
                             [2, 1, 2, 1, 0, 0, 0],
@@ -27,7 +53,7 @@ class TestBoard(unittest.TestCase):
                             [0, 0, 0, 0, 0, 0, 0]]))
         self.assertTrue(b.end == PLAYER1)
 
-        b = Board(np.array([[1, 0, 0, 0, 0, 0, 0],
+        b = Position.from_array(np.array([[1, 0, 0, 0, 0, 0, 0],
                             [0, 0, 0, 0, 0, 0, 0],
                             [0, 0, 0, 0, 0, 0, 0],
                             [0, 0, 0, 0, 0, 0, 0],
@@ -37,7 +63,7 @@ class TestBoard(unittest.TestCase):
                             [1, 1, 2, 1, 0, 0, 0]]))
         self.assertTrue(b.end == PLAYER1)
 
-        b = Board(np.array([[1, 0, 0, 0, 0, 0, 0],
+        b = Position.from_array(np.array([[1, 0, 0, 0, 0, 0, 0],
                             [0, 0, 0, 0, 0, 0, 0],
                             [0, 0, 0, 0, 0, 0, 0],
                             [0, 0, 0, 0, 0, 0, 0],
@@ -48,7 +74,7 @@ class TestBoard(unittest.TestCase):
         self.assertTrue(b.end == PLAYER1)
 
     def test_end_diag_rl(self):
-        b = Board(np.array([[1, 0, 0, 0, 0, 0, 0],
+        b = Position.from_array(np.array([[1, 0, 0, 0, 0, 0, 0],
                             [2, 1, 0, 0, 0, 0, 0],
                             [2, 2, 1, 0, 0, 0, 0],
                             [1, 1, 2, 1, 0, 0, 0],
@@ -58,7 +84,7 @@ class TestBoard(unittest.TestCase):
                             [0, 0, 0, 0, 0, 0, 0]])[::-1])
         self.assertTrue(b.end == PLAYER1)
 
-        b = Board(np.array([[1, 2, 1, 2, 1, 2, 1],
+        b = Position.from_array(np.array([[1, 2, 1, 2, 1, 2, 1],
                             [1, 2, 1, 2, 1, 1, 0],
                             [1, 2, 1, 2, 1, 0, 0],
                             [2, 1, 2, 1, 0, 0, 0],
@@ -68,7 +94,7 @@ class TestBoard(unittest.TestCase):
                             [0, 0, 0, 0, 0, 0, 0]])[::-1])
         self.assertTrue(b.end == PLAYER1)
         
-        b = Board(np.array([[1, 0, 0, 0, 0, 0, 0],
+        b = Position.from_array(np.array([[1, 0, 0, 0, 0, 0, 0],
                             [0, 0, 0, 0, 0, 0, 0],
                             [0, 0, 0, 0, 0, 0, 0],
                             [0, 0, 0, 0, 0, 0, 0],
@@ -78,7 +104,7 @@ class TestBoard(unittest.TestCase):
                             [1, 1, 2, 1, 0, 0, 0]])[::-1])
         self.assertTrue(b.end == PLAYER1)
 
-        b = Board(np.array([[1, 0, 0, 0, 0, 0, 0],
+        b = Position.from_array(np.array([[1, 0, 0, 0, 0, 0, 0],
                             [0, 0, 0, 0, 0, 0, 0],
                             [0, 0, 0, 0, 0, 0, 0],
                             [0, 0, 0, 0, 0, 0, 0],
@@ -87,3 +113,748 @@ class TestBoard(unittest.TestCase):
                             [1, 2, 1, 2, 2, 1, 0],
                             [1, 2, 1, 1, 1, 2, 1]])[::-1])
         self.assertTrue(b.end == PLAYER1)
+
+
+class TestPosition(unittest.TestCase):
+    def random_position(self, rng, nmoves):
+        game = Connect4()
+        pos = game.new_board()
+        for i in range(nmoves):
+            if game.is_terminal(pos) is not None:
+                break
+            pos = game.make_action(pos.to_move,
+                                   rng.choice(game.actions(pos)), pos)
+        return pos
+
+    def reference_evaluate(self, player_id, board, weights):
+        scores = {PLAYER1: np.zeros(5, dtype=int),
+                  PLAYER2: np.zeros(5, dtype=int)}
+        for s in Connect4.segments(board):
+            if not s.any():
+                continue
+            c = np.bincount(s, minlength=3)
+            if c[PLAYER2] == 0:
+                scores[PLAYER1][c[PLAYER1]] += 1
+            elif c[PLAYER1] == 0:
+                scores[PLAYER2][c[PLAYER2]] += 1
+        score = (weights * (scores[PLAYER1] - scores[PLAYER2])).sum()
+        return score if player_id == PLAYER1 else -score
+
+    def test_numpy_columns(self):
+        for cls in (Position, CountingPosition):
+            pos = cls.from_position(Connect4().new_board()) \
+                if cls is CountingPosition else Connect4().new_board()
+            pos.push(np.int64(3))
+            pos.push(np.int64(4))
+            pos.pop()
+            pos.play(PLAYER2, np.int64(0))
+            for x in pos.masks + [pos.key] + pos.history:
+                self.assertIn(type(x), (int, long))
+
+    def test_array_roundtrip(self):
+        rng = np.random.RandomState(0)
+        for n in range(43):
+            pos = self.random_position(rng, n)
+            copy = Position.from_array(pos.to_array())
+            self.assertEqual(copy, pos)
+            self.assertEqual(copy.hashkey(), pos.hashkey())
+
+    def test_end(self):
+        rng = np.random.RandomState(3)
+        game = Connect4()
+        for i in range(200):
+            pos = game.new_board()
+            while pos.end is None:
+                pos = game.make_action(pos.to_move,
+                                       rng.choice(game.actions(pos)), pos)
+                self.assertEqual(pos.end, pos.winner())
+
+    def test_evaluate_array(self):
+        rng = np.random.RandomState(6)
+        for n in range(200):
+            pos = self.random_position(rng, rng.randint(0, 42))
+            board = pos.to_array()
+            weights = rng.randint(-10, 10, size=5)
+            for player in (PLAYER1, PLAYER2):
+                expected = Connect4.evaluate(player, pos, weights)
+                self.assertEqual(Connect4.evaluate(player, board, weights),
+                                 expected)
+                if pos.end is None:
+                    self.assertEqual(
+                        self.reference_evaluate(player, board, weights),
+                        expected)
+
+            evaluator = Evaluator(weights)
+            self.assertEqual(evaluator.evaluate(board),
+                             evaluator.evaluate(pos))
+
+    def test_batch(self):
+        rng = np.random.RandomState(7)
+        positions = [self.random_position(rng, rng.randint(0, 43))
+                     for i in range(300)]
+        boards = np.array([p.to_array() for p in positions])
+        weights = np.array([0, 1, 3, 9, 0])
+
+        ends = Connect4.is_terminal_batch(boards)
+        for player in (PLAYER1, PLAYER2):
+            scores = Connect4.evaluate_batch(player, boards, weights)
+            for pos, end, score in zip(positions, ends, scores):
+                self.assertEqual(end, -1 if pos.end is None else pos.end)
+                self.assertEqual(score,
+                                 Connect4.evaluate(player, pos, weights))
+
+    def test_other_geometry(self):
+        rng = np.random.RandomState(8)
+        game = Connect4(8, 7)
+        positions = []
+        for i in range(100):
+            pos = game.new_board()
+            while pos.end is None:
+                pos = game.make_action(pos.to_move,
+                                       rng.choice(game.actions(pos)), pos)
+                positions.append(pos)
+        boards = np.array([p.to_array() for p in positions])
+        ends = Connect4.is_terminal_batch(boards)
+        for pos, end in zip(positions, ends):
+            self.assertEqual(end, -1 if pos.end is None else pos.end)
+
+    def test_push_pop(self):
+        rng = np.random.RandomState(4)
+        game = Connect4()
+        for i in range(50):
+            pos = game.new_board()
+            boards = []
+            while pos.end is None:
+                boards.append(pos.copy())
+                pos.push(int(rng.choice(game.actions(pos))))
+                self.assertEqual(pos.end, pos.winner())
+            while boards:
+                pos.pop()
+                expected = boards.pop()
+                self.assertEqual(pos, expected)
+                self.assertEqual(pos.heights, expected.heights)
+                self.assertEqual(pos.end, expected.end)
+                self.assertEqual(pos.hashkey(), expected.hashkey())
+
+    def test_evaluate(self):
+        rng = np.random.RandomState(1)
+        weights = np.array([0, 1, 3, 9, 0])
+        for n in range(0, 43, 2):
+            pos = self.random_position(rng, n)
+            if Connect4.is_terminal(pos) is not None:
+                continue
+            for player in (PLAYER1, PLAYER2):
+                self.assertEqual(
+                    Connect4.evaluate(player, pos, weights),
+                    self.reference_evaluate(player, pos.to_array(), weights))
+
+    def test_counting_position(self):
+        rng = np.random.RandomState(5)
+        game = Connect4()
+        weights = np.array([0, 1, 3, 9, 0])
+        for i in range(20):
+            pos = CountingPosition()
+            while pos.end is None:
+                pos.push(int(rng.choice(game.actions(pos))))
+                self.check_counting(pos, weights)
+            while pos.history:
+                pos.pop()
+                self.check_counting(pos, weights)
+
+    def check_counting(self, pos, weights):
+        fresh = CountingPosition.from_position(pos)
+        self.assertEqual(pos.counts, fresh.counts)
+        self.assertEqual(pos.scores, fresh.scores)
+        if pos.end is None:
+            plain = Position.from_array(pos.to_array())
+            self.assertEqual(Connect4.evaluate(PLAYER1, pos, weights),
+                             Connect4.evaluate(PLAYER1, plain, weights))
+
+    def test_hashkey_symmetric(self):
+        rng = np.random.RandomState(2)
+        for n in range(1, 20):
+            pos = self.random_position(rng, n)
+            mirrored = Position.from_array(pos.to_array()[::-1])
+            key, flip = Connect4.hashkey(pos)
+            mkey, mflip = Connect4.hashkey(mirrored)
+            self.assertEqual(key, mkey)
+
+
+class TestCache(unittest.TestCase):
+    def test_put_lookup(self):
+        cache = Cache(1)
+        pos = Connect4().new_board()
+        for m in (0, 1, 1, 2):
+            pos.push(m)
+        mirrored = Position.from_array(pos.to_array()[::-1])
+
+        self.assertEqual(cache.lookup(pos, 3, 1), (False, None, None))
+        cache.put(pos, 2, 3, 1, 7)
+        self.assertEqual(cache.lookup(pos, 3, 1), (True, 2, 7))
+        self.assertEqual(cache.lookup(mirrored, 2, 1), (True, 4, 7))
+        # too shallow, only the move is given
+        self.assertEqual(cache.lookup(pos, 4, 1), (False, 2, None))
+
+        cache.put(pos, 5, 3, 1, 12, -INF, 10)
+        self.assertEqual(cache.lookup(pos, 3, 1, -INF, 20), (False, 5, None))
+        self.assertEqual(cache.lookup(pos, 3, 1, -INF, 9), (True, 5, 10))
+        cache.put(pos, None, 3, 1, -30, -20, 10)
+        self.assertEqual(cache.lookup(pos, 3, 1, -30, 10), (False, None, None))
+        self.assertEqual(cache.lookup(pos, 3, 1, -20, 10), (True, None, -20))
+        # the searches below the leaves are not kept
+        other = Connect4().make_action(PLAYER1, 0, Connect4().new_board())
+        cache.put(other, 1, -1, 1, 5)
+        cache.put(other, 1, -2, 1, 5)
+        self.assertEqual(cache.lookup(other, 0, 1), (False, None, None))
+
+    def test_move(self):
+        cache = Cache(1)
+        pos = Connect4().new_board()
+        for m in (0, 1, 1, 2):
+            pos.push(m)
+        mirrored = Position.from_array(pos.to_array()[::-1])
+
+        self.assertIsNone(cache.move(pos, 0))
+        cache.put(pos, 2, 3, 1, 7)
+        self.assertEqual(cache.move(pos, 3), 2)
+        self.assertEqual(cache.move(mirrored, 2), 4)
+        self.assertIsNone(cache.move(pos, 4))
+        # the moves of the bounds are not best moves
+        cache.put(pos, 5, 3, 1, 12, -INF, 10)
+        self.assertIsNone(cache.move(pos, 3))
+        cache.put(pos, 5, 3, 1, -30, -20, 10)
+        self.assertIsNone(cache.move(pos, 3))
+
+    def test_replacement(self):
+        cache = Cache(1.0 / (1 << 20) * 2 * Cache.SLOT_SIZE)
+        game = Connect4()
+        positions = [game.make_action(PLAYER1, m, game.new_board())
+                     for m in range(3)]
+        cache.put(positions[0], 0, 5, 1, 1)
+        cache.put(positions[1], 1, 2, 1, 2)
+        cache.put(positions[2], 2, 3, 1, 3)
+        # a single bucket: the deepest entry stays, the other slot is replaced
+        self.assertEqual(cache.lookup(positions[0], 5, 1), (True, 0, 1))
+        self.assertEqual(cache.lookup(positions[1], 2, 1), (False, None, None))
+        self.assertEqual(cache.lookup(positions[2], 3, 1), (True, 2, 3))
+
+        cache.new_search()
+        cache.put(positions[1], 1, 2, 1, 2)
+        self.assertEqual(cache.lookup(positions[0], 5, 1), (False, None, None))
+        self.assertEqual(cache.lookup(positions[1], 2, 1), (True, 1, 2))
+
+    def test_shared(self):
+        cache = SharedCache(1)
+        pos = Connect4().new_board()
+        pos.push(3)
+        child = multiprocessing.Process(target=cache.put,
+                                        args=(pos, 2, 4, 1, 5))
+        child.start()
+        child.join()
+        self.assertEqual(cache.lookup(pos, 4, 1), (True, 2, 5))
+
+
+class TestPV(unittest.TestCase):
+    def test_table(self):
+        pv = PVTable(8)
+        pv.clear(4)
+        pv.update(3, 5)
+        pv.update(2, 1)
+        self.assertEqual(pv.line(2), [1, 5])
+        pv.clear(3)
+        pv.update(2, 6)
+        self.assertEqual(pv.line(2), [6])
+        self.assertEqual(pv.first(2), 6)
+        pv.clear(1)
+        self.assertEqual(pv.first(1), None)
+
+    def test_fail_low(self):
+        game = Connect4()
+        engine = PVSCachedEngine(PLAYER1, 3)
+        engine.initcnt()
+        board = engine.rootboard(game.new_board())
+        engine._pv.store(1, [6, 6])
+        self.assertEqual(engine.search(game, board, 3, 1, INF - 10, INF - 9),
+                         INF - 10)
+        # no best move: the row is not written, no move is kept
+        self.assertEqual(engine._pv.line(1), [6, 6])
+        self.assertEqual(engine._cache.lookup(board, 3, 1, INF - 10, INF - 9),
+                         (True, None, INF - 10))
+
+    def test_full_pv(self):
+        game = Connect4()
+        board = game.new_board()
+        for m in (3, 3, 2, 4):
+            board.push(m)
+        for engine in (AlphaBetaEngine(PLAYER1, 6), PVSDeepEngine(PLAYER1, 8)):
+            found = []
+            engine.showstats = lambda pv, score: found.append((pv, score))
+            move = engine.choose(game, board)
+            pv, score = found[-1]
+            self.assertEqual(pv[0], move)
+            # the cache hits do not cut the PV of the deepening
+            self.assertGreaterEqual(len(pv), engine._maxdepth)
+            child = board.copy()
+            for m in pv:
+                self.assertTrue(child.can_play(m))
+                self.assertIsNone(child.end)
+                child.push(m)
+            # the line leads to the leaf the root score comes from
+            leaf = game.evaluate(child.to_move, child)
+            self.assertEqual(score, -leaf if len(pv) % 2 else leaf)
+
+
+class TestStats(unittest.TestCase):
+    def choose(self, **kwargs):
+        game = Connect4()
+        board = game.new_board()
+        for m in (3, 3, 2):
+            board.push(m)
+        engine = PVSDeepEngine(PLAYER1, 6, endgame=0, **kwargs)
+        found = []
+        showstats = engine.showstats
+        engine.showstats = lambda pv, score: (found.append((pv, score)),
+                                              showstats(pv, score))
+        engine.choose(game, board)
+        return found[-1], engine._counters
+
+    def test_production(self):
+        result, counters = self.choose()
+        self.assertEqual(self.choose(stats='production'), (result, {
+            'nodes': 0, 'leaves': 0, 'draws': 0, 'mates': 0, 'betacuts': 0,
+            'firstcuts': 0, 'qnodes': 0, 'reductions': 0, 'reresearches': 0,
+            'failhighs': 0, 'faillows': 0, 'researches': 0, 'hits': 0,
+            'depth': 6}))
+        self.assertGreater(counters['nodes'], 0)
+
+    def test_profile(self):
+        fd, path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        # the reports are appended to the empty file
+        result, counters = self.choose(stats='profile', profile_path=path)
+        with open(path) as f:
+            reports = [json.loads(line) for line in f]
+        self.assertEqual([r['depth'] for r in reports], range(1, 7))
+        report = reports[-1]
+        self.assertEqual(report['counters']['nodes'], counters['nodes'])
+        self.assertEqual(sum(report['nodes_by_ply']), counters['nodes'])
+        self.assertEqual(report['nodes_by_ply'][0], 1)
+        self.assertEqual(sum(report['cutoffs_by_move']), counters['betacuts'])
+        self.assertEqual(report['cutoffs_by_move'][0], counters['firstcuts'])
+        self.assertTrue(all(0 <= r <= 1 for r in report['hit_rate_by_depth']
+                            if r is not None))
+        self.assertGreater(report['ebf'], 1)
+
+
+class TestRootSplit(unittest.TestCase):
+    def test_same_as_serial(self):
+        game = Connect4()
+        for moves in [(), (3, 3, 2, 4), (3, 3, 3, 3, 2, 4, 4)]:
+            board = game.new_board()
+            for m in moves:
+                board.push(m)
+            for serial_class, split_class in ((AlphaBetaEngine, ABSplitEngine),
+                                              (PVSEngine, PVSSplitEngine)):
+                found = []
+                for engine in (serial_class(PLAYER1, 4),
+                               split_class(PLAYER1, 4, workers=2)):
+                    engine.showstats = lambda pv, score: found.append(
+                        (pv[0], score))
+                    engine.choose(game, board)
+                self.assertEqual(found[0], found[1])
+
+
+class TestYBW(unittest.TestCase):
+    def test_same_score_as_serial(self):
+        game = Connect4()
+        for moves in [(), (3, 3, 2, 4), (0, 6, 1, 5, 3)]:
+            board = game.new_board()
+            for m in moves:
+                board.push(m)
+            scores = []
+            for engine in (PVSEngine(PLAYER1, 5),
+                           PVSYBWEngine(PLAYER1, 5, workers=3, split_depth=3)):
+                engine.showstats = lambda pv, score: scores.append(score)
+                engine.choose(game, board)
+            self.assertEqual(scores[0], scores[1])
+
+    def test_recycled_slot(self):
+        game = Connect4()
+        engine = PVSYBWEngine(PLAYER1, 5, workers=2, cache_mb=1)
+        engine._share(game)
+        engine._setup(1)
+        engine.initcnt()
+        board = engine.rootboard(game.new_board())
+        split = SPLITS + 7
+        # the jobs of the older node of the slot, from a copy of the board
+        # like the jobs the owner hands over
+        engine._splits[7] = split
+        engine._alphas[7] = -INF
+        old = (7, 0, (), board.copy(), 3, 3, 1, -INF, INF)
+        self.assertIsNone(engine._run_job(old))
+        self.assertEqual(engine._alphas[7], -INF)
+        result = engine._run_job((split, 0, (), board.copy(), 3, 3, 1,
+                                  -INF, INF))
+        self.assertEqual(result[0], split)
+        self.assertEqual(engine._alphas[7], result[2])
+
+
+class TestLazySMP(unittest.TestCase):
+    def test_long_pv(self):
+        game = Connect4()
+        board = game.new_board()
+        for m in (5, 1, 3, 4, 1, 3, 4, 3, 4, 5, 5, 2, 0, 0, 0, 2):
+            board.push(m)
+        engine = PVSDeepEngine(PLAYER1, 4, threads=2, quiescence=8,
+                               endgame=0)
+        # a helper run in this process, its errors are not lost
+        root = engine.rootboard(board)
+        results, width = engine._results(root)
+        engine._helper(game, root, 1, results, width)
+        self.assertEqual(results[width], 4)
+        length = results[width + 2]
+        self.assertGreater(length, 4)
+        pv = results[width + 3:width + 3 + length]
+        for m in pv:
+            self.assertTrue(root.can_play(m))
+            root.push(m)
+
+        found = []
+        engine.showstats = lambda pv, score: found.append(pv)
+        self.assertEqual(engine.choose(game, board), found[-1][0])
+
+    def test_one_table(self):
+        made = []
+        init = Cache.__dict__['__init__']
+
+        def counted_init(cache, *args, **kwargs):
+            made.append(type(cache))
+            init(cache, *args, **kwargs)
+        Cache.__init__ = counted_init
+        self.addCleanup(setattr, Cache, '__init__', init)
+
+        PVSDeepEngine(PLAYER1, 4, threads=2, cache_mb=1)
+        PVSDeepEngine(PLAYER1, 4, cache_mb=1)
+        PVSYBWEngine(PLAYER1, 4, workers=2, cache_mb=1)
+        PVSYBWEngine(PLAYER1, 4, workers=1, cache_mb=1)
+        self.assertEqual(made, [SharedCache, Cache, SharedCache, Cache])
+
+
+class TestReductions(unittest.TestCase):
+    def search(self, moves, depth, **kwargs):
+        game = Connect4()
+        board = game.new_board()
+        for m in moves:
+            board.push(m)
+        engine = PVSEngine(PLAYER1, depth, **kwargs)
+        engine.initcnt()
+        score = engine.search(game, board, depth)
+        return score, engine._counters
+
+    def test_fewer_nodes(self):
+        _, full = self.search((), 7)
+        _, reduced = self.search((), 7, reduction=1)
+        self.assertEqual(full['reductions'], 0)
+        self.assertGreater(reduced['reductions'], 0)
+        self.assertLess(reduced['nodes'], full['nodes'])
+
+    def test_reduced_below_leaves(self):
+        # the reduced searches of the depth 2 nodes would be at depth -1
+        game = Connect4()
+        board = game.new_board()
+        for m in (3, 3, 2, 4):
+            board.push(m)
+        scores = []
+        depths = []
+        for cls in (PVSEngine, PVSCachedEngine):
+            engine = cls(PLAYER1, 7, reduction=2, reduce_depth=2)
+            search = engine.search
+
+            def recorded(game_problem, board, depth, *args):
+                depths.append(depth)
+                return search(game_problem, board, depth, *args)
+            engine.search = recorded
+            engine.initcnt()
+            scores.append(engine.search(game, board.copy(), 7))
+        self.assertEqual(min(depths), 0)
+        # a corrupted cache entry gave -8388609
+        for score in scores:
+            self.assertLess(abs(score), INF - 50)
+
+    def test_win_found(self):
+        # PLAYER1 wins with 1 or 4, late moves in the 'seq' ordering
+        score = self.search((3, 3, 2, 2), 5, reduction=1, reduce_after=1)[0]
+        self.assertEqual(score, self.search((3, 3, 2, 2), 5)[0])
+        self.assertGreater(score, INF - 10)
+
+
+class TestDeepening(unittest.TestCase):
+    def test_deadline(self):
+        game = Connect4()
+        board = game.new_board()
+        engine = PVSDeepEngine(PLAYER1, 40, deadline=0.2)
+        depths = []
+        engine.showstats = lambda pv, score: depths.append(
+            (engine._counters['depth'], pv[0]))
+        start = time.time()
+        move = engine.choose(game, board)
+        self.assertLess(time.time() - start, 1)
+        # the move of the last completed depth, the board is untouched
+        self.assertEqual(move, depths[-1][1])
+        self.assertLess(depths[-1][0], 40)
+        self.assertEqual(board.nmoves, 0)
+
+    def test_aspiration_same_scores(self):
+        game = Connect4()
+        for moves in [(), (3, 3, 2, 4), (0, 6, 1, 5, 3)]:
+            board = game.new_board()
+            for m in moves:
+                board.push(m)
+            scores = []
+            for aspiration in (0, 1):
+                engine = PVSDeepEngine(PLAYER1, 7, aspiration=aspiration)
+                scores.append([score for _, _, score in engine.deepen(
+                    game, engine.rootboard(board), verbose=False)])
+            self.assertEqual(scores[0], scores[1])
+
+
+class TestMoveOrder(unittest.TestCase):
+    def test_history(self):
+        board = Connect4().new_board()
+        moveorder = MoveOrder('history')
+        self.assertEqual(list(moveorder.order(board, range(7))),
+                         [3, 2, 4, 1, 5, 0, 6])
+        moveorder.cutoff(board, 6, 2)
+        moveorder.cutoff(board, 5, 1)
+        moveorder.cutoff(board, 0, 3)
+        # the hint, the killers (the last one first), the history scores
+        self.assertEqual(list(moveorder.order(board, range(7), 3)),
+                         [3, 0, 5, 6, 2, 4, 1])
+
+    def test_evaldiff_moves(self):
+        game = Connect4()
+        rng = np.random.RandomState(0)
+        for i in range(50):
+            pos = game.new_board()
+            for j in range(rng.randint(0, 36)):
+                pos.push(rng.choice(game.actions(pos)))
+                if pos.end is not None:
+                    pos.pop()
+                    break
+            moves = game.actions(pos)
+            matrix = pos.to_array()
+            self.assertEqual(evaldiff_moves(pos, moves),
+                             [evaldiff(matrix, m, pos.to_move)
+                              for m in moves])
+
+
+class TestMTDF(unittest.TestCase):
+    def test_same_as_pvs(self):
+        game = Connect4()
+        for moves in [(), (3, 3, 2, 4), (0, 6, 1, 5, 3), (3, 3, 3, 3, 2, 4)]:
+            board = game.new_board()
+            for m in moves:
+                board.push(m)
+            found = []
+            for engine in (PVSDeepEngine(PLAYER1, 6), MTDFEngine(PLAYER1, 6)):
+                found.append([score for _, _, score in engine.deepen(
+                    game, engine.rootboard(board), verbose=False)])
+            self.assertEqual(found[0], found[1])
+
+
+class TestSolver(unittest.TestCase):
+    def test_solve(self):
+        game = Connect4()
+        engine = SolverEngine(PLAYER1)
+        # positions, their scores and the plies to the end of the game
+        for moves, score, plies in (('60503601220652240062366323551', 3, 9),
+                                    ('54562466256442440366313225030', -6, 2),
+                                    ('33633413450205406644103011042', 7, 1)):
+            board = game.new_board()
+            for m in moves:
+                board.push(int(m))
+            move, found = engine.solve(board)
+            self.assertEqual(found, score)
+            self.assertEqual(engine._solver.plies(found, board.nmoves), plies)
+            board.push(move)
+            if board.end is None:
+                self.assertEqual(engine.solve(board)[1], -score)
+
+
+class TestBook(unittest.TestCase):
+    def test_build_resume_probe(self):
+        game = Connect4()
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'book.bin')
+        try:
+            # an interrupted build: one record done, a torn one
+            board = game.new_board()
+            board.push(0)
+            key, flip = board.hashkey()
+            with open(path + '.ckpt', 'wb') as f:
+                np.array([(key, 99, 6 if flip else 0)],
+                         dtype=book.RECORD).tofile(f)
+                f.write('\x01\x02\x03')
+            book.build(path, game, PVSDeepEngine, (2,), plies=2,
+                       verbose=False)
+            self.assertFalse(os.path.exists(path + '.ckpt'))
+
+            opening = book.Book(path)
+            self.assertEqual(len(opening), len(book.positions(game, 2)))
+            # the record of the checkpoint is kept, for both sides
+            self.assertEqual(opening.probe(board), (0, 99))
+            board = game.new_board()
+            board.push(6)
+            self.assertEqual(opening.probe(board), (6, 99))
+            for m in (3, 3, 3):
+                board.push(m)
+            self.assertEqual(opening.probe(board), None)
+
+            engine = PVSDeepEngine(PLAYER1, 2, book=path)
+            board = game.new_board()
+            self.assertEqual(engine.choose(game, board),
+                             opening.probe(board)[0])
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestEndgame(unittest.TestCase):
+    def test_switch_over(self):
+        game = Connect4()
+        board = game.new_board()
+        for m in '60503601220652240062366323551':
+            board.push(int(m))
+        solver = SolverEngine(PLAYER1)
+        for engine in (PVSDeepEngine(PLAYER1, 2),
+                       ABDeepEngine(PLAYER1, 2),
+                       MonteCarloTreeSearch(PLAYER1, 10, endgame=13)):
+            move = engine.choose(game, board)
+            # the move keeps the score of the position, 3
+            board.push(move)
+            self.assertEqual(solver.solve(board)[1], -3)
+            board.pop()
+
+        # 13 empty squares
+        engine = MonteCarloTreeSearch(PLAYER1, 10, endgame=12)
+        engine.choose(game, board)
+        self.assertIsNone(engine._endgame_solver)
+
+
+class TestTactics(unittest.TestCase):
+    def test_tactics(self):
+        game = Connect4()
+        engine = AlphaBetaEngine(PLAYER1, 4)
+        board = game.new_board()
+        for m in (3, 3, 2, 2, 1):
+            board.push(m)
+        # PLAYER2 blocks one of the two squares of PLAYER1 at 0 and 4
+        self.assertEqual(engine.tactics(board, 1, 1), (None, None))
+        self.assertEqual(engine.tactics(board, 2, 1), (-(INF - 3), None))
+        self.assertEqual(engine._pv.line(1), [0, 4])
+        board.push(4)
+        self.assertEqual(engine.tactics(board, 1, 2), (INF - 3, None))
+        self.assertEqual(engine._pv.line(2), [0])
+
+        board = game.new_board()
+        for m in (0, 0, 1, 1, 2):
+            board.push(m)
+        self.assertEqual(engine.tactics(board, 2, 1), (None, [3]))
+
+    def test_same_as_full_search(self):
+        game = Connect4()
+        for moves in [(3, 3, 3, 3, 2, 2, 4, 4), (3, 2, 3, 2, 4, 4, 1, 5, 2, 2)]:
+            board = game.new_board()
+            for m in moves:
+                board.push(m)
+            scores = []
+            for tactics in (True, False):
+                engine = PVSEngine(PLAYER1, 5, quiescence=0)
+                if not tactics:
+                    engine.tactics = lambda board, depth, ply: (None, None)
+                engine.initcnt()
+                scores.append(engine.search(game, board.copy(), 5))
+            self.assertEqual(scores[0], scores[1])
+
+
+class TestQuiescence(unittest.TestCase):
+    def quiesce(self, moves, quiescence=8):
+        game = Connect4()
+        board = game.new_board()
+        for m in moves:
+            board.push(m)
+        before = (list(board.history), list(board.masks), board.key)
+        engine = AlphaBetaEngine(PLAYER1, 1, quiescence=quiescence)
+        engine.initcnt()
+        score = engine.quiesce(game, board, 1)
+        # the forced moves are taken back
+        self.assertEqual((board.history, board.masks, board.key), before)
+        return score, engine._pv.line(1), engine._counters['qnodes']
+
+    def evaluate(self, moves):
+        game = Connect4()
+        board = game.new_board()
+        for m in moves:
+            board.push(m)
+        return game.evaluate(board.to_move, board)
+
+    def test_chain(self):
+        # PLAYER2 blocks at 3, which makes a threat PLAYER1 blocks at 4
+        moves = (2, 6, 1, 5, 0)
+        self.assertEqual(self.quiesce(moves),
+                         (self.evaluate(moves + (3, 4)), [3, 4], 2))
+
+    def test_double_threat(self):
+        # PLAYER2 can not block both 0 and 4
+        self.assertEqual(self.quiesce((3, 3, 2, 2, 1)),
+                         (-(INF - 3), [0, 4], 0))
+
+    def test_budget(self):
+        moves = (2, 6, 1, 5, 0)
+        self.assertEqual(self.quiesce(moves, 1),
+                         (-self.evaluate(moves + (3,)), [3], 1))
+        self.assertEqual(self.quiesce(moves, 0),
+                         (self.evaluate(moves), [], 0))
+
+
+class TestRun(unittest.TestCase):
+    def test_parse_engine(self):
+        cls, args, kwargs = run.parse_engine(
+            'pvsdeep:8:history:threads=2:movetime=0.5:verbose=False:'
+            'book=TRUE:name=a=b')
+        self.assertIs(cls, PVSDeepEngine)
+        self.assertEqual(args, [8, 'history'])
+        self.assertEqual(kwargs, {'threads': 2, 'movetime': 0.5,
+                                  'verbose': False, 'book': True,
+                                  'name': 'a=b'})
+        self.assertIsInstance(kwargs['threads'], int)
+        self.assertIsInstance(kwargs['verbose'], bool)
+        self.assertEqual(run.parse_engine('random'), (RandomEngine, [], {}))
+
+    def test_unknown_engine(self):
+        self.assertRaises(ValueError, run.parse_engine, 'nosuchengine:4')
+        self.assertRaises(ValueError, run.engine_class, 'nosuchengine')
+
+    def test_bm_moves(self):
+        # a wrong column, a full one, a move after the end of the game
+        for moves in ('48', '40', '44a', '1111111', '44556677'):
+            args = argparse.Namespace(engine='random', moves=moves,
+                                      parser=argparse.ArgumentParser())
+            self.assertRaises(SystemExit, run.run_bm, args)
+
+
+class TestArena(unittest.TestCase):
+    def test_play(self):
+        game = Connect4()
+        e1 = RandomEngine(PLAYER2)
+        e2 = WeightedGreedyEngine(PLAYER1, verbose=False)
+        board, winner, looser = play(game, e1, e2)
+        self.assertEqual((e1.playing_as, e2.playing_as), (PLAYER1, PLAYER2))
+        end = game.is_terminal(board)
+        self.assertIsNotNone(end)
+        if winner is None:
+            self.assertEqual(end, DRAW)
+            self.assertIsNone(looser)
+        else:
+            self.assertEqual(winner.playing_as, end)
+            self.assertIn((winner, looser), [(e1, e2), (e2, e1)])
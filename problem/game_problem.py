@@ -1,6 +1,7 @@
 from abc import ABCMeta, abstractmethod
 import numpy as np
-from problem import utils
+from problem import utils, tables
+from problem.position import Position
 from utils import PLAYER1, PLAYER2, DRAW, INF
 
 class Game:
@@ -64,134 +65,215 @@ class Connect4(Game):
     def get_board_dim(self):
         return self._cols, self._rows
 
+    def new_board(self):
+        """Return the empty starting position"""
+        return Position(self._cols, self._rows)
+
     @classmethod
     def is_terminal(cls, board):
         """
         Return whether the current configuration of board is a terminal state
-        :param board: game board state
+        :param board: game board state (a Position)
         :return: None, in case it is not a terminal state. DRAW in case it was
                 a draw, PLAYER1, PLAYER2 in case there was a win.
         """
-        # Checks whether a player has won
-        for seg in Connect4.segments(board):
-            c = np.bincount(seg)
-            if c[0]:
-                continue
-            if c[PLAYER1] == 4:
-                return PLAYER1
-            elif c[PLAYER2] == 4:
-                return PLAYER2
-        # Checks whether there was a tie.
-        if board.all():
-            return DRAW
-        else:
-            return None
-        
+        return board.end
+
     @classmethod
     def get_win_segment(cls, pos):
-        
-        def process(seg):
-            w_seg = {}
-            _indexes = np.arange(7 * 6).reshape((7, 6))
-            _indexes = np.rot90(_indexes)
-            for i in seg:
-                for row in range(0,6):
-                    for col in range(0,7):
-                        if _indexes[row][col] == i:
-                            w_seg[(row, col)] = True
-            return w_seg
-
-        for i,seg in enumerate(cls.segments(pos)):
+        """Return the squares of the winning segment of a board matrix
+
+        The squares are given as {(row, col): True}, row 0 being the top row
+        of the board as it is drawn.
+        """
+        rows = pos.shape[1]
+        all_segments = tables.segment_tables(*pos.shape).all_segments
+        for i, seg in enumerate(cls.segments(pos)):
             c = np.bincount(seg)
             if c[0]:
                 continue
             if c[PLAYER1] == 4 or c[PLAYER2] == 4:
-                return process(utils.all_segments[i])
-                            
-
-    @classmethod
-    def _check_end_around(cls, pos, r, c, side):
-        """Check whether the game has end by side or whether there was a tie"""
-        if (cls.segments_around(pos, r, c) == side).all(1).any():
-            return side
-
-        if pos.all():
-            return DRAW
-        else:
-            return None
+                return dict(((rows - 1 - idx % rows, idx // rows), True)
+                            for idx in all_segments[i])
 
     @classmethod
     def segments(cls, board):
-        board = board.flatten()
-        return board[utils.all_segments]
+        all_segments = tables.segment_tables(*board.shape).all_segments
+        return board.flatten()[all_segments]
 
     @classmethod
     def rev_segments(cls, board):
+        rev_segments = tables.segment_tables(*board.shape).rev_segments
         board = board.flatten()
-        return board[utils.rev_segments]
+        return [board[x] for x in rev_segments]
 
     @classmethod
     def segments_around(cls, board, r, c):
         idx = c * board.shape[1] + r
-        board = board.flatten()
-        return board[utils.rev_segments[idx]]
+        rev_segments = tables.segment_tables(*board.shape).rev_segments
+        return board.flatten()[rev_segments[idx]]
 
     def make_action(self, player, action, board):
         """
         Make move to the board.
         :param player: The player to make the move. See Constant in game.py
         :param action: the column to place a chip
-        :param board: the board game
+        :param board: the board game (a Position)
         :return: a new board game with the action signed.
         """
-        if not (0 <= action < self._cols):
-            raise ValueError(action)
-
         if action is None:
             return
-        
-        pos = board.copy()
 
-        free_row = pos[action].argmin()
-        if pos[action][free_row] != 0:
+        if not (0 <= action < self._cols):
+            raise ValueError(action)
+
+        if not board.can_play(action):
             raise utils.WrongMoveError('Full/Occupied Column')
-        pos[action][free_row] = player
+
+        pos = board.copy()
+        pos.play(player, int(action))
         return pos
-    
-    def actions(self, board):   
-        return np.flatnonzero(board[:, -1] == 0)
-    
+
+    def actions(self, board):
+        rows = self._rows
+        return [c for c, h in enumerate(board.heights) if h < rows]
+
     @classmethod
-    def evaluate(cls, player_id, board, weights=np.asarray([0, 0, 1, 4, 0])):
-        scores = {PLAYER1: np.zeros(5, dtype=int),
-                  PLAYER2: np.zeros(5, dtype=int)}
+    def segment_codes(cls, board):
+        """Return the base-3 code of every segment of a board matrix
+
+        board can also be a stack of board matrices (N, cols, rows), then
+        the codes of each board are returned as a (N, segments) array.
+        """
+        if board.ndim == 2:
+            return np.dot(cls.segments(board), tables.SEGMENT_BASE)
+
+        # one column of squares at a time, in bytes, to keep the
+        # intermediate arrays small on big stacks
+        flat = board.reshape((len(board), -1)).astype(np.uint8)
+        segments = tables.segment_tables(*board.shape[1:]).all_segments
+        codes = flat[:, segments[:, 0]]
+        for i in range(1, 4):
+            codes += np.uint8(tables.SEGMENT_BASE[i]) * flat[:, segments[:, i]]
+        return codes
 
-        if Connect4.is_terminal(board) is not None:
-            if Connect4.is_terminal(board) == DRAW:
+    _weights_tables = {}
+
+    @classmethod
+    def weights_table(cls, weights):
+        """Return the lookup table of the score of a segment by its code
+
+        The score is given for PLAYER1: weights[k] for a segment holding k
+        chips of PLAYER1 only, -weights[k] for k chips of PLAYER2 only.
+        """
+        key = tuple(weights)
+        try:
+            return cls._weights_tables[key]
+        except KeyError:
+            pass
+
+        w = np.asarray(weights)
+        segment_chips = tables.code_tables().segment_chips
+        c1 = segment_chips[PLAYER1]
+        c2 = segment_chips[PLAYER2]
+        table = np.where(c2 == 0, w[c1], 0) - np.where(c1 == 0, w[c2], 0)
+        cls._weights_tables[key] = table
+        return table
+
+    @classmethod
+    def codes_winner(cls, codes, board):
+        """is_terminal for a board matrix whose segment codes are given"""
+        if (codes == tables.SEGMENT_BASE.sum() * PLAYER1).any():
+            return PLAYER1
+        elif (codes == tables.SEGMENT_BASE.sum() * PLAYER2).any():
+            return PLAYER2
+        elif board.all():
+            return DRAW
+        else:
+            return None
+
+    @classmethod
+    def is_terminal_batch(cls, boards, codes=None):
+        """is_terminal for a stack of board matrices (N, cols, rows)
+
+        Returns an array with PLAYER1, PLAYER2 or DRAW for the boards where
+        the game is over and -1 for the others.
+        """
+        if codes is None:
+            codes = cls.segment_codes(boards)
+        ends = np.full(len(boards), -1, dtype=int)
+        ends[boards.reshape((len(boards), -1)).all(1)] = DRAW
+        ends[(codes == tables.SEGMENT_BASE.sum() * PLAYER2).any(1)] = PLAYER2
+        ends[(codes == tables.SEGMENT_BASE.sum() * PLAYER1).any(1)] = PLAYER1
+        return ends
+
+    @classmethod
+    def evaluate_batch(cls, player_id, boards, weights=(0, 0, 1, 4, 0)):
+        """evaluate for a stack of board matrices (N, cols, rows)
+
+        Returns the N scores as an array, of floats if the game is over
+        on some of the boards (their scores are +/-INF or 0).
+        """
+        codes = cls.segment_codes(boards)
+        ends = cls.is_terminal_batch(boards, codes)
+
+        scores = cls.weights_table(weights)[codes].sum(1)
+        if player_id != PLAYER1:
+            scores = -scores
+
+        over = ends >= 0
+        if over.any():
+            scores = scores.astype(float)
+            scores[ends == DRAW] = 0
+            scores[over & (ends != DRAW)] = -INF
+            scores[ends == player_id] = INF
+        return scores
+
+    @classmethod
+    def evaluate(cls, player_id, board, weights=(0, 0, 1, 4, 0)):
+        if isinstance(board, np.ndarray):
+            return cls.evaluate_array(player_id, board, weights)
+
+        end = board.end
+        if end is not None:
+            if end == DRAW:
                 return 0
-            elif Connect4.is_terminal(board) == player_id:
+            elif end == player_id:
                 return INF
             else:
                 return -INF
 
-        segments = Connect4.segments(board)
-        filtered_segments = segments[segments.any(1)]
+        if isinstance(weights, np.ndarray):
+            weights = weights.tolist()
 
-        for s in filtered_segments:
-            c = np.bincount(s, minlength=3)
+        scores = board.histograms()
+        h1 = scores[PLAYER1]
+        h2 = scores[PLAYER2]
 
-            c1 = c[PLAYER1]
-            c2 = c[PLAYER2]
+        score = 0
+        for w, c1, c2 in zip(weights, h1, h2):
+            if w:
+                score += w * (c1 - c2)
 
-            if c2 == 0:
-                scores[PLAYER1][c1] += 1
-            elif c1 == 0:
-                scores[PLAYER2][c2] += 1
+        if player_id == PLAYER1:
+            return score
+        else:
+            return -score
 
-        s1 = (weights * scores[PLAYER1]).sum()
-        s2 = (weights * scores[PLAYER2]).sum()
+    @classmethod
+    def evaluate_array(cls, player_id, board, weights=(0, 0, 1, 4, 0)):
+        """evaluate for a board matrix, driven by the segment codes"""
+        codes = cls.segment_codes(board)
+        end = cls.codes_winner(codes, board)
+        if end is not None:
+            if end == DRAW:
+                return 0
+            elif end == player_id:
+                return INF
+            else:
+                return -INF
 
-        score = s1 - s2
+        score = cls.weights_table(weights)[codes].sum()
         if player_id == PLAYER1:
             return score
         else:
@@ -205,20 +287,4 @@ class Connect4(Game):
         flip is True if it returned the key of the symmetric Board.
 
         """
-        k1 = 0
-        k2 = 0
-
-        for x in board.flat:
-            k1 *= 3
-            k1 += int(x)
-            assert k1 >= 0
-
-        for x in board[::-1].flat:
-            k2 *= 3
-            k2 += int(x)
-            assert k2 >= 0
-
-        if k2 < k1:
-            return k2, True
-        else:
-            return k1, False
+        return board.hashkey()
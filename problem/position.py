@@ -0,0 +1,481 @@
+"""Bitboard representation of a Connect4 position.
+
+The chips of each player are kept in an integer bitmask where the square at
+column ``c`` and row ``r`` (row 0 being the bottom one) is the bit
+``c * (rows + 1) + r``. Every column has an extra sentinel bit on top that is
+never set, so that shifting a mask by one of the four directions never wraps
+a line around the edge of the board.
+
+The NumPy matrix used by the view and the GameEngine (``board[col][row]``) is
+only a conversion: see Position.from_array and Position.to_array.
+
+Positions are hashed with 64 bits Zobrist keys, updated when a chip is
+dropped or taken back. The key of the left-right mirrored position is
+maintained alongside so that symmetric positions share the same hashkey.
+"""
+import random
+from collections import namedtuple
+
+import numpy as np
+
+from problem import tables
+from problem.utils import PLAYER1, PLAYER2, DRAW
+
+
+Geometry = namedtuple('Geometry', 'cols rows height size bottom full directions '
+                                  'segments cell_segments cell_segment_ids '
+                                  'zobrist zobrist_mirror winning')
+
+ZOBRIST_SEED = 0xc4
+
+_geometries = {}
+
+
+def geometry(cols, rows):
+    """Return the (memoized) bitboard constants of a cols x rows board"""
+    try:
+        return _geometries[cols, rows]
+    except KeyError:
+        pass
+
+    height = rows + 1
+    bottom = 0
+    for c in range(cols):
+        bottom |= 1 << (c * height)
+    full = bottom * ((1 << rows) - 1)
+    # vertical, horizontal and the two diagonals
+    directions = (1, height, height - 1, height + 1)
+
+    # the mask of every segment and, for every square, the masks (and the
+    # indices) of the segments that pass by it; the segments are the ones of
+    # the board matrix tables, with their squares moved to the bitboard layout
+    segments = []
+    cell_segments = [[] for x in range(cols * height)]
+    cell_segment_ids = [[] for x in range(cols * height)]
+    for seg in tables.segment_tables(cols, rows).all_segments.tolist():
+        seg = [(i // rows) * height + i % rows for i in seg]
+        mask = 0
+        for idx in seg:
+            mask |= 1 << idx
+        for idx in seg:
+            cell_segments[idx].append(mask)
+            cell_segment_ids[idx].append(len(segments))
+        segments.append(mask)
+
+    # zobrist[player][idx] is the random key of a chip of player at idx,
+    # zobrist_mirror[player][idx] the one of the mirrored square
+    rnd = random.Random(ZOBRIST_SEED)
+    zobrist = [None, None, None]
+    zobrist_mirror = [None, None, None]
+    for player in (PLAYER1, PLAYER2):
+        zobrist[player] = [rnd.getrandbits(64) for x in range(cols * height)]
+    for player in (PLAYER1, PLAYER2):
+        zobrist_mirror[player] = [
+            zobrist[player][(cols - 1 - idx // height) * height + idx % height]
+            for idx in range(cols * height)]
+
+    # winning(position, free) is the mask of the squares of free where a
+    # chip makes four with the chips of position
+    geo = Geometry(cols, rows, height, cols * height, bottom, full, directions,
+                   tuple(segments), tuple(tuple(x) for x in cell_segments),
+                   tuple(tuple(x) for x in cell_segment_ids),
+                   zobrist, zobrist_mirror, winning_function(height, full))
+    _geometries[cols, rows] = geo
+    return geo
+
+
+def winning_function(height, full):
+    """Return a function of (position, free) giving the squares of free
+    that would make four with position
+
+    The masks are cut before the left shifts so that the integers stay
+    within a machine word (Python 2 int rather than long).
+    """
+    lines = []
+    for d in (height, height - 1, height + 1):
+        lines.append((d, 2 * d, 3 * d,
+                      full >> d, full >> 2 * d, full >> 3 * d))
+    vertical = full >> 3
+
+    def winning(position, free):
+        p = position & (position >> 1) & (position >> 2)
+        r = (p & vertical) << 3
+        for d, d2, d3, f1, f2, f3 in lines:
+            l1 = (position & f1) << d
+            r1 = position >> d
+            p = l1 & ((position & f2) << d2)
+            r |= p & (((position & f3) << d3) | r1)
+            p = r1 & (position >> d2)
+            r |= p & (l1 | (position >> d3))
+        return r & free
+    return winning
+
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+
+def has_four(mask, directions):
+    """Return True if mask contains four aligned and consecutive bits"""
+    for d in directions:
+        m = mask & (mask >> d)
+        if m & (m >> (d << 1)):
+            return True
+    return False
+
+
+def segment_histograms(m1, m2, geo):
+    """Count the segments that contain the chips of only one player
+
+    Returns two lists h1, h2 where ``h1[k]`` is the number of segments with
+    exactly k chips of m1 and none of m2 (and the other way round for h2).
+    ``h1[0]`` and ``h2[0]`` are always 0: empty segments are not counted.
+
+    The segments of every direction, for both players, are laid side by side
+    in one wide integer and the four squares of a segment are added up as
+    bit-sliced counters, so that no Python loop runs over the segments.
+    """
+    full = geo.full
+    size = geo.size
+    x0 = x1 = x2 = x3 = 0
+    shift = 0
+    for mine, free in ((m1, full & ~m2), (m2, full & ~m1)):
+        for d in geo.directions:
+            d2 = d << 1
+            d3 = d2 + d
+            # a bit of opened is the start of a segment free of opponent chips
+            opened = free & (free >> d) & (free >> d2) & (free >> d3)
+            x0 |= (mine & opened) << shift
+            x1 |= ((mine >> d) & opened) << shift
+            x2 |= ((mine >> d2) & opened) << shift
+            x3 |= ((mine >> d3) & opened) << shift
+            shift += size
+
+    a = x0 & x1
+    b = x0 ^ x1
+    c = x2 & x3
+    e = x2 ^ x3
+    counts = ((b ^ e) & ~(a | c),                 # one chip
+              ((a ^ c) & ~(b | e)) | (b & e),     # two chips
+              (a & e) | (b & c),                  # three chips
+              a & c)                              # four chips
+
+    half = shift >> 1
+    low = (1 << half) - 1
+    h1 = [0]
+    h2 = [0]
+    for cnt in counts:
+        h1.append(popcount(cnt & low))
+        h2.append(popcount(cnt >> half))
+    return h1, h2
+
+
+class Position(object):
+    """A Connect4 position: two bitmasks plus the height of the columns
+
+    masks[PLAYER1] and masks[PLAYER2] hold the chips of each player,
+    masks[0] the union of both.
+    end is the result of the game (None while it is not over), it is
+    updated by play looking only at the segments through the dropped chip.
+    history is the stack of the columns played with push, so that they can
+    be taken back with pop.
+    key and mkey are the Zobrist keys of the position and of its mirror.
+    """
+    __slots__ = ['geometry', 'masks', 'heights', 'nmoves', 'end', 'history',
+                 'key', 'mkey']
+
+    def __init__(self, cols=7, rows=6):
+        self.geometry = geometry(cols, rows)
+        self.masks = [0, 0, 0]
+        self.heights = [0] * cols
+        self.nmoves = 0
+        self.end = None
+        self.history = []
+        self.key = 0
+        self.mkey = 0
+
+    @classmethod
+    def from_array(cls, board):
+        """Build a position from a board matrix (board[col][row])"""
+        cols, rows = board.shape
+        pos = cls(cols, rows)
+        geo = pos.geometry
+        for c in range(cols):
+            for r in range(rows):
+                player = int(board[c, r])
+                if player == 0:
+                    break
+                idx = c * geo.height + r
+                pos.masks[player] |= 1 << idx
+                pos.masks[0] |= 1 << idx
+                pos.heights[c] += 1
+                pos.nmoves += 1
+                pos.key ^= geo.zobrist[player][idx]
+                pos.mkey ^= geo.zobrist_mirror[player][idx]
+        pos.end = pos.winner()
+        return pos
+
+    def to_array(self):
+        """Return the position as a board matrix (board[col][row])"""
+        geo = self.geometry
+        board = np.zeros((geo.cols, geo.rows), dtype=int)
+        for player in (PLAYER1, PLAYER2):
+            mask = self.masks[player]
+            while mask:
+                low = mask & -mask
+                idx = low.bit_length() - 1
+                board[idx // geo.height, idx % geo.height] = player
+                mask ^= low
+        return board
+
+    def children_array(self, cols):
+        """Return the stack of the board matrices after the side to move
+        plays each of cols"""
+        board = self.to_array()
+        children = np.repeat(board[np.newaxis], len(cols), axis=0)
+        player = self.to_move
+        for i, c in enumerate(cols):
+            children[i, c, self.heights[c]] = player
+        return children
+
+    def copy(self):
+        pos = self.__class__.__new__(self.__class__)
+        pos.geometry = self.geometry
+        pos.masks = self.masks[:]
+        pos.heights = self.heights[:]
+        pos.nmoves = self.nmoves
+        pos.end = self.end
+        pos.history = self.history[:]
+        pos.key = self.key
+        pos.mkey = self.mkey
+        return pos
+
+    @property
+    def cols(self):
+        return self.geometry.cols
+
+    @property
+    def rows(self):
+        return self.geometry.rows
+
+    @property
+    def to_move(self):
+        """The player whose turn it is"""
+        return PLAYER2 if self.nmoves & 1 else PLAYER1
+
+    def can_play(self, col):
+        return self.heights[col] < self.geometry.rows
+
+    def playable(self):
+        """Return the mask of the squares a chip can be dropped on"""
+        return (self.masks[0] + self.geometry.bottom) & self.geometry.full
+
+    def winning_squares(self, player):
+        """Return the mask of the playable squares where player makes four"""
+        geo = self.geometry
+        masks = self.masks
+        return (geo.winning(masks[player], geo.full ^ masks[0]) &
+                (masks[0] + geo.bottom) & geo.full)
+
+    def play(self, player, col):
+        """Drop a chip of player in col, modifying the position in place"""
+        # a NumPy integer would make the masks NumPy integers too, slower
+        col = int(col)
+        geo = self.geometry
+        masks = self.masks
+        idx = col * geo.height + self.heights[col]
+        bit = 1 << idx
+        mine = masks[player] = masks[player] | bit
+        masks[0] |= bit
+        self.heights[col] += 1
+        self.nmoves += 1
+        self.key ^= geo.zobrist[player][idx]
+        self.mkey ^= geo.zobrist_mirror[player][idx]
+
+        # only the segments through the new chip can have been completed
+        for seg in geo.cell_segments[idx]:
+            if mine & seg == seg:
+                self.end = player
+                return
+        if masks[0] == geo.full:
+            self.end = DRAW
+
+    def push(self, col):
+        """Drop a chip of the side to move in col, in place
+
+        Moves can only be pushed while the game is not over.
+        """
+        col = int(col)
+        self.play(PLAYER2 if self.nmoves & 1 else PLAYER1, col)
+        self.history.append(col)
+
+    def pop(self):
+        """Take back the last pushed move and return its column"""
+        col = self.history.pop()
+        geo = self.geometry
+        self.nmoves -= 1
+        player = PLAYER2 if self.nmoves & 1 else PLAYER1
+        height = self.heights[col] = self.heights[col] - 1
+        idx = col * geo.height + height
+        masks = self.masks
+        masks[player] ^= 1 << idx
+        masks[0] ^= 1 << idx
+        self.key ^= geo.zobrist[player][idx]
+        self.mkey ^= geo.zobrist_mirror[player][idx]
+        self.end = None
+        return col
+
+    def winner(self):
+        """Return PLAYER1/PLAYER2 if it has four in a row, DRAW if the board
+        is full, None otherwise
+
+        Unlike end this looks at the whole board.
+        """
+        directions = self.geometry.directions
+        if has_four(self.masks[PLAYER1], directions):
+            return PLAYER1
+        if has_four(self.masks[PLAYER2], directions):
+            return PLAYER2
+        if self.masks[0] == self.geometry.full:
+            return DRAW
+        return None
+
+    def histograms(self):
+        """Return the segment histograms of both players
+
+        See segment_histograms, the result is indexed by player.
+        """
+        h1, h2 = segment_histograms(self.masks[PLAYER1], self.masks[PLAYER2],
+                                    self.geometry)
+        return None, h1, h2
+
+    def hashkey(self):
+        """Return a tuple (key, flip)
+
+        flip is True if key is the one of the symmetric position.
+        """
+        if self.mkey < self.key:
+            return self.mkey, True
+        else:
+            return self.key, False
+
+    def __eq__(self, other):
+        return (isinstance(other, Position) and
+                self.geometry == other.geometry and
+                self.masks == other.masks)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __getstate__(self):
+        # the geometry is pickled as its dimensions, not as its tables
+        state = dict((name, getattr(self, name))
+                     for cls in type(self).__mro__
+                     for name in cls.__dict__.get('__slots__', ()))
+        state['geometry'] = (self.cols, self.rows)
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.geometry = geometry(*self.geometry)
+
+    def __repr__(self):
+        return '<Position %dx%d moves=%d>' % (self.geometry.cols,
+                                              self.geometry.rows, self.nmoves)
+
+
+class CountingPosition(Position):
+    """A Position that keeps its segment histograms up to date
+
+    counts[player][s] is the number of chips of player in the segment s and
+    scores[player][k] the number of segments with k chips of player and none
+    of the opponent (for k = 0 those are the empty segments, the same for
+    both players). They are updated by play and pop looking only at the
+    segments through the chip, so that histograms() costs nothing.
+    """
+    __slots__ = ['counts', 'scores']
+
+    def __init__(self, cols=7, rows=6):
+        super(CountingPosition, self).__init__(cols, rows)
+        nsegments = len(self.geometry.segments)
+        self.counts = [None, [0] * nsegments, [0] * nsegments]
+        self.scores = [None, [nsegments, 0, 0, 0, 0], [nsegments, 0, 0, 0, 0]]
+
+    @classmethod
+    def from_position(cls, board):
+        """Build a CountingPosition equal to board (a Position)"""
+        pos = cls.__new__(cls)
+        for attr in Position.__slots__:
+            setattr(pos, attr, getattr(board, attr))
+        pos.masks = board.masks[:]
+        pos.heights = board.heights[:]
+        pos.history = board.history[:]
+
+        pos.counts = [None, [], []]
+        pos.scores = [None, [0] * 5, [0] * 5]
+        for seg in pos.geometry.segments:
+            c1 = popcount(seg & pos.masks[PLAYER1])
+            c2 = popcount(seg & pos.masks[PLAYER2])
+            pos.counts[PLAYER1].append(c1)
+            pos.counts[PLAYER2].append(c2)
+            if c2 == 0:
+                pos.scores[PLAYER1][c1] += 1
+            if c1 == 0:
+                pos.scores[PLAYER2][c2] += 1
+        return pos
+
+    @classmethod
+    def from_array(cls, board):
+        return cls.from_position(Position.from_array(board))
+
+    def copy(self):
+        pos = super(CountingPosition, self).copy()
+        pos.counts = [None, self.counts[PLAYER1][:], self.counts[PLAYER2][:]]
+        pos.scores = [None, self.scores[PLAYER1][:], self.scores[PLAYER2][:]]
+        return pos
+
+    def play(self, player, col):
+        idx = col * self.geometry.height + self.heights[col]
+        Position.play(self, player, col)
+
+        other = PLAYER1 if player == PLAYER2 else PLAYER2
+        mine = self.counts[player]
+        theirs = self.counts[other]
+        my_scores = self.scores[player]
+        their_scores = self.scores[other]
+        for s in self.geometry.cell_segment_ids[idx]:
+            c = mine[s]
+            t = theirs[s]
+            if t == 0:
+                my_scores[c] -= 1
+                my_scores[c + 1] += 1
+            if c == 0:
+                their_scores[t] -= 1
+            mine[s] = c + 1
+
+    def pop(self):
+        col = Position.pop(self)
+        idx = col * self.geometry.height + self.heights[col]
+
+        player = PLAYER2 if self.nmoves & 1 else PLAYER1
+        other = PLAYER1 if player == PLAYER2 else PLAYER2
+        mine = self.counts[player]
+        theirs = self.counts[other]
+        my_scores = self.scores[player]
+        their_scores = self.scores[other]
+        for s in self.geometry.cell_segment_ids[idx]:
+            c = mine[s] - 1
+            t = theirs[s]
+            if t == 0:
+                my_scores[c + 1] -= 1
+                my_scores[c] += 1
+            if c == 0:
+                their_scores[t] += 1
+            mine[s] = c
+        return col
+
+    def histograms(self):
+        return self.scores
@@ -0,0 +1,131 @@
+"""Segment tables and segment code lookup tables
+
+Segments are quartets of indices that represent four squares aligned and
+consecutive in the board, the index of the square at column c and row r of a
+board matrix being ``c * rows + r``.
+If a segment contains chips of a single player, that player won the game.
+
+The segment tables depend on the geometry of the board, they are built the
+first time they are asked for a given geometry. The lookup tables are indexed
+by the base-3 code of a segment (the dot product of its squares with
+SEGMENT_BASE) and are the same for every board.
+
+All the tables are built lazily and memoized per process. When the
+C4_TABLES_DIR environment variable names a directory they are also saved
+there as .npy files, and later processes load them instead of building them.
+"""
+import os
+from collections import namedtuple
+
+import numpy as np
+
+
+SEGMENT_BASE = np.array([3**0, 3**1, 3**2, 3**3], dtype=int)
+
+# all_segments is a 2d array, each row is a segment
+# rev_segments is an index square -> group of segments that pass by the square
+SegmentTables = namedtuple('SegmentTables', 'all_segments rev_segments')
+
+# evaldiff_lookup[player][code] keeps the scores of segment combos,
+# evaldiff_threat_lookup[player][code] is used to check if the opponent would
+# win if we don't fill the empty square,
+# segment_chips[player][code] is the number of chips of player in the segment
+CodeTables = namedtuple('CodeTables',
+                        'evaldiff_lookup evaldiff_threat_lookup segment_chips')
+
+_segment_tables = {}
+_code_tables = []
+
+
+def segment_tables(cols=7, rows=6):
+    """Return the SegmentTables of a cols x rows board"""
+    try:
+        return _segment_tables[cols, rows]
+    except KeyError:
+        pass
+
+    all_segments = _load_or_build('segments_%dx%d' % (cols, rows),
+                                  lambda: _build_segments(cols, rows))
+
+    rev_segments = tuple(all_segments[(all_segments == idx).any(1)]
+                         for idx in range(cols * rows))
+
+    tables = SegmentTables(all_segments, rev_segments)
+    _segment_tables[cols, rows] = tables
+    return tables
+
+
+def code_tables():
+    """Return the CodeTables"""
+    if not _code_tables:
+        table = _load_or_build('segment_codes', _build_codes)
+        _code_tables.append(CodeTables(
+            {1: table[0], 2: table[1]},
+            {1: table[2], 2: table[3]},
+            {1: table[4], 2: table[5]}))
+    return _code_tables[0]
+
+
+def _load_or_build(name, build):
+    directory = os.environ.get('C4_TABLES_DIR')
+    if not directory:
+        return build()
+
+    path = os.path.join(directory, name + '.npy')
+    try:
+        return np.load(path)
+    except IOError:
+        pass
+
+    table = build()
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # write aside and rename, so that concurrent processes never load a
+        # partial file
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp, 'wb') as f:
+            np.save(f, table)
+        os.rename(tmp, path)
+    except (IOError, OSError):
+        pass
+    return table
+
+
+def _build_segments(cols, rows):
+    indices = np.arange(cols * rows).reshape((cols, rows))
+    segments = []
+
+    def add(line):
+        for x in range(len(line) - 3):
+            segments.append(line[x:x + 4])
+
+    for col in indices:
+        add(col)
+
+    for row in indices.transpose():
+        add(row)
+
+    for idx in (indices, indices[:, ::-1]):
+        for di in range(-cols + 1, rows):
+            add(idx.diagonal(di))
+
+    return np.array(segments, dtype=int).reshape((-1, 4))
+
+
+def _build_codes():
+    codes = np.arange(3**4)
+    squares = (codes[:, np.newaxis] // SEGMENT_BASE) % 3
+    c0, c1, c2 = [(squares == x).sum(1) for x in range(3)]
+
+    empty = c0 == 4
+    only1 = ~empty & (c0 + c1 == 4)
+    only2 = ~empty & ~only1 & (c0 + c2 == 4)
+
+    score1 = np.select([empty, only1, only2], [1, (c1 + 1) ** 2, c2 ** 2])
+    score2 = np.select([empty, only1, only2], [1, c1 ** 2, (c2 + 1) ** 2])
+
+    threat1 = score2 == 4 ** 2
+    threat2 = ~threat1 & (score1 == 4 ** 2)
+
+    return np.array([score1, score2, threat1, threat2, c1, c2], dtype=int)
@@ -2,38 +2,65 @@
 import sys
 import random
 import argparse
-from view import view
-import yaml
-import numpy as np
+import importlib
 import os
 
-from control import controller, eventmanager
-from agents import (GreedyEngine, WeightedGreedyEngine, RandomEngine,
-                    MonteCarloTreeSearch, NegamaxEngine, AlphaBetaEngine,
-                    ABCachedEngine, ABDeepEngine, PVSEngine, PVSCachedEngine,
-                    PVSDeepEngine, HumanEngine)
-
-from game.game import GameEngine
-from game.arena import arena
-from problem.utils import PLAYER1, PLAYER2
-from view.settings import set_logging_config
-
+# Only the modules needed by every command are imported here: the view (and
+# pygame) is imported by the game command, PyYAML when an arena config is
+# parsed and the engines when they are looked up in engine_map.
 
+# engine name -> 'module:class'
 engine_map = {
-    'greedy': GreedyEngine,
-    'weighted': WeightedGreedyEngine,
-    'mcts': MonteCarloTreeSearch,
-    'random': RandomEngine,
-    'negamax': NegamaxEngine,
-    'alphabeta': AlphaBetaEngine,
-    'abcached': ABCachedEngine,
-    'abdeep': ABDeepEngine,
-    'pvs': PVSEngine,
-    'pvscached': PVSCachedEngine,
-    'pvsdeep': PVSDeepEngine,
+    'greedy': 'agents.greedy:GreedyEngine',
+    'weighted': 'agents.greedy:WeightedGreedyEngine',
+    'mcts': 'agents.mcts:MonteCarloTreeSearch',
+    'random': 'agents.rand:RandomEngine',
+    'negamax': 'agents.negamax:NegamaxEngine',
+    'alphabeta': 'agents.alphabeta:AlphaBetaEngine',
+    'abcached': 'agents.alphabeta:ABCachedEngine',
+    'abdeep': 'agents.alphabeta:ABDeepEngine',
+    'absplit': 'agents.alphabeta:ABSplitEngine',
+    'pvs': 'agents.pvs:PVSEngine',
+    'pvscached': 'agents.pvs:PVSCachedEngine',
+    'pvsdeep': 'agents.pvs:PVSDeepEngine',
+    'pvssplit': 'agents.pvs:PVSSplitEngine',
+    'pvsybw': 'agents.pvs:PVSYBWEngine',
+    'mtdf': 'agents.mtdf:MTDFEngine',
+    'solver': 'agents.solver:SolverEngine',
     }
 
 
+def engine_class(name):
+    """Import and return the engine class registered as name"""
+    if name not in engine_map:
+        raise ValueError('Unknown engine: %s' % name)
+    module, cls = engine_map[name].split(':')
+    return getattr(importlib.import_module(module), cls)
+
+
+def parse_engine(spec):
+    """Split an engine_name:par1:par2:...:key=value:... spec
+
+    Returns the engine class, its positional and its keyword parameters,
+    numbers and booleans (true or false, in any case) are converted.
+    """
+    def convert(arg):
+        if arg.lower() in ('true', 'false'):
+            return arg.lower() == 'true'
+        for kind in (int, float):
+            try:
+                return kind(arg)
+            except ValueError:
+                pass
+        return arg
+
+    name, params = spec.split(':')[0], spec.split(':')[1:]
+    args = [convert(x) for x in params if '=' not in x]
+    kwargs = dict((key, convert(value)) for key, value in
+                  (x.split('=', 1) for x in params if '=' in x))
+    return engine_class(name), args, kwargs
+
+
 def main():
     os.environ['SDL_VIDEO_CENTERED'] = '1'  # This makes the window centered on the screen
 
@@ -45,7 +72,7 @@ def main():
 
     game_parser = subparsers.add_parser('game', help='Play with an engine')
     game_parser.add_argument('engine', metavar='ENGINE',
-                             help='Engine to use. Format: engine_name:par1:par2:...')
+                             help='Engine to use. Format: engine_name:par1:par2:...:key=value:...')
     game_parser.add_argument('--player2', default=False, action='store_true',
                              help='Play as player 2')
     game_parser.set_defaults(cmd=run_game)
@@ -58,12 +85,30 @@ def main():
 
     bm_parser = subparsers.add_parser('bm', help='Select the bestmove')
     bm_parser.add_argument('engine', metavar='ENGINE',
-                           help='Engine to use. Format: engine_name:par1:par2:...')
-    bm_parser.set_defaults(cmd=run_bm)
+                           help='Engine to use. Format: engine_name:par1:par2:...:key=value:...')
+    bm_parser.add_argument('-m', '--moves', default='',
+                           help='Columns (1 to 7) played before, e.g. 4453')
+    bm_parser.set_defaults(cmd=run_bm, parser=bm_parser)
+
+    book_parser = subparsers.add_parser('book', help='Build an opening book')
+    book_parser.add_argument('output', metavar='BOOKFILE')
+    book_parser.add_argument('engine', metavar='ENGINE', nargs='?',
+                             default='pvsdeep:8:history',
+                             help='Engine analysing the positions, one that '
+                                  'solves them or deepens. Format: '
+                                  'engine_name:par1:par2:...:key=value:...')
+    book_parser.add_argument('-p', '--plies', type=int, default=6,
+                             help='Book the positions with up to PLIES chips')
+    book_parser.add_argument('-w', '--workers', type=int, default=1,
+                             help='Number of processes')
+    book_parser.add_argument('-c', '--checkpoint', default=None,
+                             help='Checkpoint file, BOOKFILE.ckpt by default')
+    book_parser.set_defaults(cmd=run_book)
 
     args = parser.parse_args()
 
     if args.static_seed is not None:
+        import numpy as np
         np.random.seed(args.static_seed)
         random.seed(args.static_seed)
 
@@ -71,14 +116,18 @@ def main():
 
 
 def run_game(args):
+    from view import view
+    from view.settings import set_logging_config
+    from control import controller, eventmanager
+    from agents.human import HumanEngine
+    from game.game import GameEngine
+    from problem.utils import PLAYER1, PLAYER2
 
     # setting logging
     set_logging_config(dev=False)
 
     # parsing ai engine information
-    engine_name = args.engine.split(':')[0]
-    engine_args = args.engine.split(':')[1:]
-    engine_class = engine_map[engine_name]
+    engine_class, engine_args, engine_kwargs = parse_engine(args.engine)
 
     # define game manager modules (mvc design)
     ev_manager = eventmanager.EventManager()
@@ -87,10 +136,10 @@ def run_game(args):
     graphics = view.GameView(ev_manager, game_model)
 
     if not args.player2:
-        p1 = HumanEngine(PLAYER1, view, 'human')
-        p2 = engine_class(PLAYER2, *engine_args)
+        p1 = HumanEngine(PLAYER1, graphics, 'human')
+        p2 = engine_class(PLAYER2, *engine_args, **engine_kwargs)
     else:
-        p1 = engine_class(PLAYER1, *engine_args)
+        p1 = engine_class(PLAYER1, *engine_args, **engine_kwargs)
         p2 = HumanEngine(PLAYER2, graphics, 'human')
 
     # Start game
@@ -98,13 +147,18 @@ def run_game(args):
 
 
 def run_arena(args):
-    config = yaml.load(args.config)
+    import yaml
+    from game.arena import arena
+    from problem.utils import PLAYER1
+
+    config = yaml.safe_load(args.config)
     engines = []
     subscribed_engines = set()
     for i, engine_cfg in enumerate(config):
-        engine_class = engine_map[engine_cfg.pop('class')]
+        cls = engine_class(engine_cfg.pop('class'))
         engine_name = engine_cfg.pop('name', None)
-        engine = engine_class(**engine_cfg)
+        # the arena switches the side of the engines between games
+        engine = cls(PLAYER1, **engine_cfg)
         if engine_name is None:
             engine_name = str(engine)
         if engine_name not in subscribed_engines:
@@ -121,14 +175,35 @@ def run_arena(args):
 
 
 def run_bm(args):
-    engine_name = args.engine.split(':')[0]
-    engine_args = args.engine.split(':')[1:]
-    engine_class = engine_map[engine_name]
-    engine = engine_class(*engine_args)
-    move = engine.choose(Board())
+    from problem.game_problem import Connect4
+    from problem.utils import PLAYER1
+
+    cls, engine_args, engine_kwargs = parse_engine(args.engine)
+    engine = cls(PLAYER1, *engine_args, **engine_kwargs)
+    game_problem = Connect4()
+    board = game_problem.new_board()
+    for i, col in enumerate(args.moves, 1):
+        if board.end is not None:
+            args.parser.error('move %d (%s): the game is over' % (i, col))
+        if not col.isdigit() or not 1 <= int(col) <= board.cols:
+            args.parser.error('move %d (%s): no such column' % (i, col))
+        if not board.can_play(int(col) - 1):
+            args.parser.error('move %d (%s): the column is full' % (i, col))
+        board.push(int(col) - 1)
+    move = engine.choose(game_problem, board)
     print('Move: %d' % (move + 1))
 
 
+def run_book(args):
+    from game import book
+    from problem.game_problem import Connect4
+
+    cls, engine_args, engine_kwargs = parse_engine(args.engine)
+    book.build(args.output, Connect4(), cls, engine_args, engine_kwargs,
+               plies=args.plies, workers=args.workers,
+               checkpoint=args.checkpoint)
+
+
 if __name__ == '__main__':
     random.seed()
     sys.exit(main())